@@ -3,13 +3,14 @@ import json
 from gradio_calendar import Calendar
 import os
 import pandas as pd
-from datetime import datetime, date
-from models.diagnosis import extract_diagnosis as extract_diagnosis_model
-from models.features import extract_features as extract_features_model
+from datetime import datetime
+from models.extraction import extract_diagnosis_and_features as extract_diagnosis_and_features_model, stream_diagnosis_and_features as stream_diagnosis_and_features_model
+from models.storage import CustomJSONEncoder, diagnosis_edits, get_note_store, symptom_edits, edit_note as edit_note_model, save_note as save_note_model
+from models.users import get_user_directory
+from models.records import decode_note
 from models.symptoms import get_all_symptom_data as symptoms_data_model
 from models.analytics import visualize_symptoms as visualize_symptoms_model
 from models.report import generate_report as generate_report_model, generate_pdf_report as generate_pdf_report_model
-import re
 import time
 
 # Global variables
@@ -22,28 +23,22 @@ all_symptoms_df = pd.DataFrame()
 all_symptoms_list = None
 # State for json_files
 json_files_state = gr.State([])
+# Stream extraction results into the UI as they are generated
+STREAM_EXTRACTION = os.environ.get("STREAM_EXTRACTION", "true").lower() in ("1", "true", "yes")
 
 
 # Function to load existing JSON files
 def load_existing_json_files():
     global json_files, doctor_id, patient_id
     json_files = []
-    doctor_notes_dir = 'data/doctor_notes/'
     
     # Ensure both doctor_id and patient_id are available
     if not doctor_id or not patient_id:
         print("Warning: doctor_id or patient_id is not set")
         return json_files
 
-    for filename in os.listdir(doctor_notes_dir):
-        if filename.endswith('.json'):
-            # Use regex to match the expected format: 'doctor_note_yyyymmdd_hhmmss_doctorid_patientid.json'
-            match = re.search(r'doctor_note_\d{8}_\d{6}_(\d+)_(\d+)\.json', filename)
-            if match and match.group(1) == doctor_id and match.group(2) == patient_id:
-                json_files.append(os.path.join(doctor_notes_dir, filename))
-    
-    # Sort files by creation time (most recent first)
-    json_files.sort(key=lambda x: os.path.getctime(x), reverse=True)
+    # Indexed lookup in the note catalog, sorted by creation time (most recent first)
+    json_files = get_note_store().notes_of_patient(doctor_id, patient_id)
     
     return json_files
 
@@ -55,25 +50,20 @@ def reset_json_files():
 # Login function to check username and password
 def login(username, password):
     global doctor_id  # Add this line
-    # Load user data from JSON file
-    with open('data/users/users.json', 'r') as file:
-        users = json.load(file)
-    for user_id, user_info in users.items():
-        if user_info['username'] == username and user_info['password'] == password:
-            # Login successful, show home page
-            if user_info['role'] == 'doctor':  # Add this condition
-                doctor_id = user_id  # Store the doctor_id
-            return gr.update(visible=False), gr.update(visible=True), gr.update(visible=False, value=""), f"Welcome {user_info['first_name']} {user_info['last_name']}! You are logged in as a {user_info['role']}."
+    # Indexed lookup with a constant-time password check
+    user = get_user_directory().authenticate(username, password)
+    if user:
+        user_id, user_info = user
+        # Login successful, show home page
+        if user_info['role'] == 'doctor':  # Add this condition
+            doctor_id = user_id  # Store the doctor_id
+        return gr.update(visible=False), gr.update(visible=True), gr.update(visible=False, value=""), f"Welcome {user_info['first_name']} {user_info['last_name']}! You are logged in as a {user_info['role']}."
     # Login failed
     return gr.update(visible=True), gr.update(visible=False), gr.update(visible=True, value="Incorrect username or password. Please try again."), ""
 
 # Function to load patients from the JSON file
 def load_patients():
-    with open('data/users/users.json', 'r') as file:
-        users = json.load(file)
-    patients = {f"{info['first_name']} {info['last_name']}": user_id 
-                for user_id, info in users.items() if info['role'] == 'patient'}
-    return patients
+    return get_user_directory().patients()
 
 # Function to update the patient_id when a patient is selected
 def update_patient_id(selected_patient_name):
@@ -98,50 +88,27 @@ def update_patient_id(selected_patient_name):
         gr.update(value=json_files)  # Update the State component
     )
 
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        return super().default(obj)
-
-# Create JSON files based on doctor's note and date
-def create_json_file(input_text, selected_date):
+# Write a doctor's note with its extracted diagnosis and features to the note store
+def save_doctor_note(input_text, selected_date, diagnosis, features):
     global json_files, patient_id, doctor_id
-    diagnosis = extract_diagnosis_model(input_text)
-    features = extract_features_model(input_text)
-
-    current_time = datetime.now().strftime("%H:%M:%S")
-    formatted_date = selected_date.strftime("%Y-%m-%d") if isinstance(selected_date, datetime) else selected_date.split('T')[0]
-    data = {
-        "doctor_id": doctor_id,
-        "patient_id": patient_id,
-        "date": f"{formatted_date}T{current_time}",
-        "doctor_note": input_text,
-        "diagnosis": diagnosis,
-        "features": features
-    }
-    filename = f"doctor_note_{formatted_date.replace('-', '')}_{current_time.replace(':', '')}_{doctor_id}_{patient_id}.json"
-
-    doctor_notes_dir = 'data/doctor_notes/'
-    os.makedirs(doctor_notes_dir, exist_ok=True)
-    file_path = os.path.join(doctor_notes_dir, filename)
-
-    with open(file_path, "w") as json_file:
-        json.dump(data, json_file, indent=2, cls=CustomJSONEncoder)
-
+    file_path, data = save_note_model(doctor_id, patient_id, selected_date, input_text, diagnosis, features)
     json_files.append(file_path)
 
     return json.dumps(data, indent=2, cls=CustomJSONEncoder) if data else "{}"
 
+# Create JSON files based on doctor's note and date
+def create_json_file(input_text, selected_date):
+    # Diagnosis and features are extracted concurrently
+    diagnosis, features = extract_diagnosis_and_features_model(input_text)
+    return save_doctor_note(input_text, selected_date, diagnosis, features)
+
 def preview_json(selected_file):
     if selected_file:
         full_path = next(
             (f for f in json_files if os.path.basename(f) == selected_file), None
         )
         if full_path:
-            with open(full_path, "r") as file:
-                content = file.read()
-            return content
+            return json.dumps(get_note_store().read_note(full_path), indent=2)
     return "{}"
 
 def update_file_selector():
@@ -152,56 +119,54 @@ def visualize_symptoms():
     return visualize_symptoms_model(all_symptoms_df)
 
 def get_latest_json_file():
-    doctor_notes_dir = 'data/doctor_notes/'
-    json_files = [f for f in os.listdir(doctor_notes_dir) if f.endswith('.json')]
-    if not json_files:
-        return None
-    return max(json_files, key=lambda x: os.path.getctime(os.path.join(doctor_notes_dir, x)))
+    latest_file = get_note_store().latest_note(doctor_id, patient_id)
+    return os.path.basename(latest_file) if latest_file else None
 
 def extract_symptoms(text):
     symptoms = []
-    for symptom_name, symptom_data in text['features']['symptoms'].items():
-        symptom = {
-            "name": symptom_name,
-            "location": symptom_data.get('location', ''),
-            "intensity": int(symptom_data['intensity']) if symptom_data['intensity'] != '-1' else 0,
-            "is_active": bool(symptom_data.get('is_active', False))
-        }
-        symptoms.append(symptom)
+    # Typed record: intensity is an int (None if not mentioned) and is_active a bool
+    for symptom in decode_note(text).symptoms.values():
+        symptoms.append({
+            "name": symptom.name,
+            "location": symptom.location or '',
+            "intensity": symptom.intensity if symptom.intensity is not None else 0,
+            "is_active": symptom.is_active
+        })
     return symptoms
 
+def submit_note_outputs(data, json_content, latest_file):
+    diagnosis = data.get('diagnosis', {}).get('diagnosis', '')
+    diagnosis_reasoning = data.get('diagnosis', {}).get('reasoning', '')
+    symptoms = extract_symptoms(data)
+    symptom_names = [symptom['name'] for symptom in symptoms]
+    
+    first_symptom = symptoms[0] if symptoms else {}
+    
+    return (
+        gr.update(open=False),
+        diagnosis,
+        diagnosis_reasoning,
+        gr.update(visible=True),  # Show diagnosis_component
+        json_content,
+        latest_file,
+        gr.update(interactive=False, variant="secondary"),
+        gr.update(visible=True),
+        gr.update(choices=symptom_names, value=symptom_names[0] if symptom_names else None, visible=True),
+        gr.update(value=first_symptom.get('name', '')),
+        gr.update(value=first_symptom.get('location', '')),
+        gr.update(value=first_symptom.get('intensity', 0)),
+        gr.update(value=first_symptom.get('is_active', False)),
+        gr.update(visible=True)  # Show symptoms_component
+    )
+
 def submit_note(input_text, selected_date):
     json_content = create_json_file(input_text, selected_date)
     
     latest_file = get_latest_json_file()
     if latest_file:
-        file_path = os.path.join('data/doctor_notes/', latest_file)
-        with open(file_path, 'r') as file:
-            data = json.load(file)
-        
-        diagnosis = data.get('diagnosis', {}).get('diagnosis', '')
-        diagnosis_reasoning = data.get('diagnosis', {}).get('reasoning', '')
-        symptoms = extract_symptoms(data)
-        symptom_names = [symptom['name'] for symptom in symptoms]
-        
-        first_symptom = symptoms[0] if symptoms else {}
+        data = get_note_store().read_note(latest_file)
         
-        return (
-            gr.update(open=False),
-            diagnosis,
-            diagnosis_reasoning,
-            gr.update(visible=True),  # Show diagnosis_component
-            json_content,
-            latest_file,
-            gr.update(interactive=False, variant="secondary"),
-            gr.update(visible=True),
-            gr.update(choices=symptom_names, value=symptom_names[0] if symptom_names else None, visible=True),
-            gr.update(value=first_symptom.get('name', '')),
-            gr.update(value=first_symptom.get('location', '')),
-            gr.update(value=first_symptom.get('intensity', 0)),
-            gr.update(value=first_symptom.get('is_active', False)),
-            gr.update(visible=True)  # Show symptoms_component
-        )
+        return submit_note_outputs(data, json_content, latest_file)
     return (
         gr.update(open=True),
         "",
@@ -216,32 +181,41 @@ def submit_note(input_text, selected_date):
         gr.update(visible=False)  # Hide symptoms_component
     )
 
+# Streaming variant of submit_note: the diagnosis and symptom fields fill in while the model is still generating
+def submit_note_stream(input_text, selected_date):
+    results = {}
+    for name, document, is_final in stream_diagnosis_and_features_model(input_text):
+        if is_final:
+            results[name] = document
+        if name == "diagnosis":
+            # Diagnosis textbox and reasoning
+            yield (
+                gr.update(), document.get('diagnosis', ''), document.get('reasoning', ''), gr.update(visible=True),
+                gr.update(), gr.update(), gr.update(interactive=False, variant="secondary"), gr.update(), gr.update(),
+                gr.update(), gr.update(), gr.update(), gr.update(), gr.update()
+            )
+        else:
+            # Symptom dropdown, filled as symptom names complete
+            symptom_names = list(document.get('symptoms', {}).keys()) if isinstance(document.get('symptoms'), dict) else []
+            yield (
+                gr.update(), gr.update(), gr.update(), gr.update(),
+                gr.update(), gr.update(), gr.update(interactive=False, variant="secondary"), gr.update(),
+                gr.update(choices=symptom_names, visible=True), gr.update(), gr.update(), gr.update(), gr.update(),
+                gr.update(visible=True)
+            )
+
+    # Persist exactly what the non-streaming path would have stored
+    json_content = save_doctor_note(input_text, selected_date, results["diagnosis"], results["features"])
+    data = json.loads(json_content)
+    yield submit_note_outputs(data, json_content, os.path.basename(json_files[-1]))
+
 def update_symptom(original_name, name, location, intensity, is_active, current_file, selected_file):
     file_to_update = current_file if current_file else selected_file
     if file_to_update:
-        file_path = os.path.join('data/doctor_notes/', file_to_update)
         try:
-            with open(file_path, 'r+') as file:
-                data = json.load(file)
-                symptoms = data['features']['symptoms']
-                
-                new_symptom_data = {
-                    'location': str(location),
-                    'intensity': str(intensity),
-                    'is_active': str(is_active).capitalize()
-                }
-                
-                # Check if the symptom name changed
-                if original_name == name:
-                    symptoms[name].update(new_symptom_data)
-                else:
-                    # Remove the old entry and add the new one
-                    symptoms[name] = symptoms.pop(original_name)
-                    symptoms[name] = new_symptom_data
-                
-                file.seek(0)
-                json.dump(data, file, indent=2)
-                file.truncate()
+            data = edit_note_model(
+                file_to_update, symptom_edits(original_name, name, location, intensity, is_active)
+            )
             
             symptom_names = list(data['features']['symptoms'].keys())
             return gr.update(visible=False), json.dumps(data, indent=2), gr.update(choices=symptom_names, value=name), gr.update(visible=True, value="Symptom updated successfully"), gr.update()
@@ -254,16 +228,15 @@ def update_symptom(original_name, name, location, intensity, is_active, current_
 def load_symptom(symptom_name, current_file, selected_file):
     file_to_load = current_file if current_file else selected_file
     if file_to_load:
-        file_path = os.path.join('data/doctor_notes/', file_to_load)
         try:
-            with open(file_path, 'r') as file:
-                data = json.load(file)
-            symptom_data = data['features']['symptoms'].get(symptom_name, {})
+            symptom = get_note_store().read_record(file_to_load).symptoms.get(symptom_name)
+            if symptom is None:
+                return symptom_name, '', 0, False
             return (
                 symptom_name,
-                symptom_data.get('location', ''),
-                int(symptom_data.get('intensity', '0')),
-                bool(symptom_data.get('is_active', False))
+                symptom.location or '',
+                symptom.intensity if symptom.intensity is not None else -1,
+                symptom.is_active
             )
         except IOError:
             pass
@@ -288,14 +261,8 @@ def reset_interface():
 def update_diagnosis(diagnosis, reasoning, current_file, selected_file):
     file_to_update = current_file if current_file else selected_file
     if file_to_update:
-        file_path = os.path.join('data/doctor_notes/', file_to_update)
         try:
-            with open(file_path, 'r+') as file:
-                data = json.load(file)
-                data['diagnosis']['diagnosis'] = diagnosis
-                file.seek(0)
-                json.dump(data, file, indent=2)
-                file.truncate()
+            data = edit_note_model(file_to_update, diagnosis_edits(diagnosis))
             return gr.update(visible=True, value="Diagnosis updated successfully"), json.dumps(data, indent=2), gr.update()  # Show status with success message
         except IOError:
             return gr.update(visible=True, value=f"Update failed: Could not write to file {file_to_update}"), "{}", gr.update()
@@ -349,14 +316,8 @@ def on_analytics_tab_select():
 def update_diagnosis_with_delay(diagnosis, reasoning, current_file, selected_file):
     file_to_update = current_file if current_file else selected_file
     if file_to_update:
-        file_path = os.path.join('data/doctor_notes/', file_to_update)
         try:
-            with open(file_path, 'r+') as file:
-                data = json.load(file)
-                data['diagnosis']['diagnosis'] = diagnosis
-                file.seek(0)
-                json.dump(data, file, indent=2)
-                file.truncate()
+            data = edit_note_model(file_to_update, diagnosis_edits(diagnosis))
             status = "Diagnosis updated successfully"
             json_content = json.dumps(data, indent=2)
         except IOError:
@@ -381,27 +342,10 @@ def update_diagnosis_with_delay(diagnosis, reasoning, current_file, selected_fil
 def update_symptom_with_delay(original_name, name, location, intensity, is_active, current_file, selected_file):
     file_to_update = current_file if current_file else selected_file
     if file_to_update:
-        file_path = os.path.join('data/doctor_notes/', file_to_update)
         try:
-            with open(file_path, 'r+') as file:
-                data = json.load(file)
-                symptoms = data['features']['symptoms']
-                
-                new_symptom_data = {
-                    'location': str(location),
-                    'intensity': str(intensity),
-                    'is_active': str(is_active).capitalize()
-                }
-                
-                if original_name == name:
-                    symptoms[name].update(new_symptom_data)
-                else:
-                    symptoms[name] = symptoms.pop(original_name)
-                    symptoms[name] = new_symptom_data
-                
-                file.seek(0)
-                json.dump(data, file, indent=2)
-                file.truncate()
+            data = edit_note_model(
+                file_to_update, symptom_edits(original_name, name, location, intensity, is_active)
+            )
             
             symptom_names = list(data['features']['symptoms'].keys())
             status = "Symptom updated successfully"
@@ -640,7 +584,7 @@ if __name__ == "__main__":
             )
 
             submit_btn.click(
-                fn=submit_note,
+                fn=submit_note_stream if STREAM_EXTRACTION else submit_note,
                 inputs=[input_text, date_picker_calendar],
                 outputs=[
                     note_accordion, diagnosis_textbox, reasoning_textbox, diagnosis_component, 
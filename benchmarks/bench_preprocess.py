@@ -0,0 +1,130 @@
+"""Micro-benchmark of report preprocessing: grouped preprocess_data against the former per-symptom loop.
+
+Generates synthetic symptom lists of each size, checks that both versions produce the same
+processed_data and reports the best time of each.
+
+    python -m benchmarks.bench_preprocess --sizes 100 10000 1000000 --symptoms 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def preprocess_data_loop(data):
+    """preprocess_data as it was before the groupby rewrite: one boolean filter per symptom and iterrows"""
+    df = pd.DataFrame(data)
+    df['intensity'] = pd.to_numeric(df['intensity'], errors='coerce')
+    df["date"] = pd.to_datetime(df["date"])
+
+    processed_data = {
+        "time_period": f"{df['date'].min().strftime('%Y-%m-%d')} to {df['date'].max().strftime('%Y-%m-%d')}",
+        "symptoms": list(df["symptom"].unique()),
+        "measurements": [],
+        "temporal_markers": [],
+    }
+
+    for symptom in processed_data["symptoms"]:
+        symptom_data = df[df["symptom"] == symptom]
+
+        max_intensity = symptom_data["intensity"].max()
+        avg_intensity = symptom_data["intensity"].mean()
+        active_days = int(symptom_data["is_active"].astype(bool).sum())
+        total_days = len(symptom_data)
+
+        processed_data["measurements"].append(
+            {
+                "symptom": symptom,
+                "max_intensity": max_intensity,
+                "avg_intensity": avg_intensity,
+                "active_days": active_days,
+                "total_days": total_days,
+                "activity_rate": active_days / total_days if total_days > 0 else 0,
+            }
+        )
+
+        intensity_changes = symptom_data["intensity"].diff()
+        significant_changes = symptom_data[abs(intensity_changes) > 0.3]
+
+        for _, change in significant_changes.iterrows():
+            processed_data["temporal_markers"].append(
+                {
+                    "date": change["date"].strftime("%Y-%m-%d"),
+                    "symptom": symptom,
+                    "change": change["intensity"]
+                    - (change["intensity"] - intensity_changes[change.name]),
+                    "description": change["reason"],
+                }
+            )
+
+    return processed_data
+
+
+def synthetic_data(rows, symptoms, seed=0):
+    """Symptom list in the shape of models.symptoms.create_symptom_list, patient visits interleaving symptoms"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2015-01-01", periods=max(1, rows // symptoms), freq="D").strftime("%Y-%m-%dT%H:%M:%S")
+    intensity = rng.integers(0, 11, rows) / 10
+    # Unmentioned intensities arrive as None
+    intensity = np.where(rng.random(rows) < 0.05, None, intensity)
+    return [
+        {
+            "symptom": f"symptom {i % symptoms}",
+            "date": dates[min(i // symptoms, len(dates) - 1)],
+            "is_active": bool(active),
+            "intensity": value,
+            "reason": f"Patient reports symptom {i % symptoms}, details: note {i}",
+        }
+        for i, (active, value) in enumerate(zip(rng.random(rows) > 0.1, intensity))
+    ]
+
+
+def rounded(value):
+    """`value` with floats rounded: grouped means can differ from Series.mean in the last bit"""
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    if isinstance(value, float):
+        return round(value, 9)
+    return value
+
+
+def best_time(function, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10000, 1000000])
+    parser.add_argument("--symptoms", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    from models.report import preprocess_data
+
+    print(f"{'rows':>10}{'loop (ms)':>14}{'grouped (ms)':>14}{'speedup':>10}")
+    for size in args.sizes:
+        data = synthetic_data(size, min(args.symptoms, size))
+        # One run of the loop is enough once it takes seconds
+        loop_time, expected = best_time(preprocess_data_loop, data, args.repeat if size <= 100000 else 1)
+        grouped_time, result = best_time(preprocess_data, data, args.repeat)
+        if json.dumps(rounded(result), default=str) != json.dumps(rounded(expected), default=str):
+            print(f"{size} rows: grouped output differs from the loop version")
+        print(f"{size:>10}{loop_time * 1000:>14.1f}{grouped_time * 1000:>14.1f}{loop_time / grouped_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
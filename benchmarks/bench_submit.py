@@ -0,0 +1,119 @@
+"""End-to-end latency benchmark of the app's hot paths against the offline Groq mock.
+
+Drives create_json_file, submit_note (blocking and streaming), fetch_symptom_data and
+display_report in a scratch copy of data/ and reports p50/p95 latency and LLM calls per operation.
+
+    python -m benchmarks.bench_submit --iterations 20 --latency 0.5
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="mock latency per LLM call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--use-cache", action="store_true", help="keep the LLM completion cache enabled")
+    parser.add_argument("--with-pdf", action="store_true", help="include PDF rendering (needs wkhtmltopdf) in display_report")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    from benchmarks.mock_groq import MockGroq, load_recordings_from_notes, start_server
+
+    # Scratch workspace so the benchmark never touches the real notes
+    workspace = tempfile.mkdtemp(prefix="bench_submit_")
+    shutil.copytree(os.path.join(REPO_ROOT, "data"), os.path.join(workspace, "data"), ignore=shutil.ignore_patterns("cache"))
+    os.chdir(workspace)
+
+    mock = MockGroq(load_recordings_from_notes(), args.latency, args.jitter, args.error_rate, args.malformed_rate, seed=0)
+    server, base_url = start_server(mock)
+
+    # The gateway reads its configuration at import time
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ["GROQ_API_KEY"] = "mock"
+    os.environ["GROQ_REQUESTS_PER_MINUTE"] = "100000"
+    os.environ["GROQ_TOKENS_PER_MINUTE"] = "100000000"
+    os.environ["LLM_CACHE_DIR"] = os.path.join(workspace, "data", "cache", "completions")
+    if not args.use_cache:
+        os.environ["LLM_CACHE_DISABLED"] = "1"
+
+    import app
+    if not args.with_pdf:
+        app.generate_pdf_report_model = lambda markdown, patient_id, plot: None
+
+    app.doctor_id, app.patient_id = "0", "2"
+    app.load_existing_json_files()
+    sample_notes = list(load_recordings_from_notes())
+
+    def run_create(i):
+        app.create_json_file(sample_notes[i % len(sample_notes)], "2024-11-01T00:00:00")
+
+    def run_submit(i):
+        app.submit_note(sample_notes[i % len(sample_notes)], "2024-11-02T00:00:00")
+
+    first_output = []
+
+    def run_submit_stream(i):
+        start = time.perf_counter()
+        for n, _ in enumerate(app.submit_note_stream(sample_notes[i % len(sample_notes)], "2024-11-03T00:00:00")):
+            if n == 0:
+                first_output.append((time.perf_counter() - start) * 1000)
+
+    def run_fetch(i):
+        # Force a rebuild of the symptom table, as after a new note
+        app.all_symptoms_df = None
+        app.fetch_symptom_data()
+
+    def run_report(i):
+        app.display_report()
+
+    operations = [
+        ("create_json_file", run_create),
+        ("submit_note", run_submit),
+        ("submit_note_stream", run_submit_stream),
+        ("fetch_symptom_data", run_fetch),
+        ("display_report", run_report),
+    ]
+
+    print(f"mock latency {args.latency}s ±{args.jitter}s, error rate {args.error_rate}, malformed rate {args.malformed_rate}, cache {'on' if args.use_cache else 'off'}")
+    print(f"{'operation':<22}{'p50 (ms)':>10}{'p95 (ms)':>10}{'calls/op':>10}{'errors':>8}")
+    for name, operation in operations:
+        timings = []
+        errors = 0
+        mock.reset()
+        for i in range(args.iterations):
+            start = time.perf_counter()
+            try:
+                operation(i)
+            except Exception as e:
+                errors += 1
+                print(f"{name} failed: {e}")
+            timings.append((time.perf_counter() - start) * 1000)
+        calls = mock.stats()["total"] / args.iterations
+        print(f"{name:<22}{statistics.median(timings):>10.1f}{percentile(timings, 0.95):>10.1f}{calls:>10.2f}{errors:>8}")
+
+    if first_output:
+        print(f"submit_note_stream time to first output: p50 {statistics.median(first_output):.1f} ms, p95 {percentile(first_output, 0.95):.1f} ms")
+
+    server.shutdown()
+    shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Compare the full and compact extraction prompt variants.
+
+Runs diagnosis and feature extraction with both variants over the same notes and reports
+prompt/completion tokens (from the API usage fields), latency and how often the compact
+variant agrees with the full one.
+
+    python -m benchmarks.compare_prompts --limit 20            # live API
+    python -m benchmarks.compare_prompts --mock                # offline, against the Groq mock
+    python -m benchmarks.compare_prompts --csv notebooks/test_data/doctor_notes_series.csv --column doctor_note
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sys
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VARIANTS = ["full", "compact"]
+
+
+def load_notes(csv_path=None, column="doctor_note", limit=None):
+    notes = []
+    if csv_path:
+        with open(csv_path, newline="") as file:
+            notes = [row[column] for row in csv.DictReader(file) if row.get(column)]
+    else:
+        for path in sorted(glob.glob(os.path.join(REPO_ROOT, "data", "doctor_notes", "**", "*.json"), recursive=True)):
+            with open(path, "r") as file:
+                notes.append(json.load(file)["doctor_note"])
+    return notes[:limit] if limit else notes
+
+
+def words(text):
+    return set(re.findall(r"[a-z0-9]+", str(text).lower()))
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def diagnosis_agreement(full, compact):
+    if "error" in full or "error" in compact:
+        return 0.0
+    return jaccard(words(full.get("diagnosis", "")), words(compact.get("diagnosis", "")))
+
+
+def features_agreement(full, compact):
+    if "error" in full or "error" in compact:
+        return 0.0
+    names_full = {name.lower() for name in full.get("symptoms", {})}
+    names_compact = {name.lower() for name in compact.get("symptoms", {})}
+    return jaccard(names_full, names_compact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", help="CSV with doctor notes (defaults to the notes in data/doctor_notes/)")
+    parser.add_argument("--column", default="doctor_note")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--mock", action="store_true", help="run against the offline Groq mock")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    if args.mock:
+        from benchmarks.mock_groq import MockGroq, load_recordings_from_notes, start_server
+        _, base_url = start_server(MockGroq(load_recordings_from_notes(os.path.join(REPO_ROOT, "data", "doctor_notes"))))
+        os.environ["GROQ_BASE_URL"] = base_url
+        os.environ["GROQ_API_KEY"] = "mock"
+
+    from models import llm
+    from models.diagnosis import extract_diagnosis
+    from models.features import extract_features
+
+    notes = load_notes(args.csv, args.column, args.limit)
+    results = {variant: {"diagnosis": [], "features": []} for variant in VARIANTS}
+    usage = {}
+    for variant in VARIANTS:
+        llm.reset_usage()
+        for note in notes:
+            results[variant]["diagnosis"].append(extract_diagnosis(note, use_cache=False, prompt_variant=variant))
+            results[variant]["features"].append(extract_features(note, use_cache=False, prompt_variant=variant))
+        usage[variant] = llm.get_usage_report()
+
+    print(f"{len(notes)} notes")
+    print(f"{'call site':<12}{'variant':<10}{'prompt tok/call':>16}{'completion tok/call':>21}{'latency/call (s)':>18}")
+    for call_site in ["diagnosis", "features"]:
+        for variant in VARIANTS:
+            stats = usage[variant].get(call_site, {})
+            calls = stats.get("calls", 0) or 1
+            print(
+                f"{call_site:<12}{variant:<10}{stats.get('prompt_tokens', 0) / calls:>16.0f}"
+                f"{stats.get('completion_tokens', 0) / calls:>21.0f}{stats.get('avg_latency_seconds', 0.0):>18.2f}"
+            )
+
+    for call_site, agreement in [("diagnosis", diagnosis_agreement), ("features", features_agreement)]:
+        scores = [agreement(full, compact) for full, compact in zip(results["full"][call_site], results["compact"][call_site])]
+        exact = sum(score == 1.0 for score in scores)
+        mean = sum(scores) / len(scores) if scores else 0.0
+        print(f"{call_site} agreement compact vs full: mean word/name Jaccard {mean:.2f}, identical {exact}/{len(scores)}")
+
+
+if __name__ == "__main__":
+    main()
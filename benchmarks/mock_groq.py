@@ -0,0 +1,222 @@
+"""Offline stand-in for the Groq chat-completions endpoint.
+
+Replays recorded responses (by default derived from the notes in data/doctor_notes/) and can
+inject latency, provider errors and malformed JSON. Point the app at it with
+GROQ_BASE_URL=http://127.0.0.1:<port>.
+
+    python -m benchmarks.mock_groq --port 8765 --latency 0.8 --error-rate 0.05
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_DIAGNOSIS = {"diagnosis": "unknown", "reasoning": ""}
+DEFAULT_FEATURES = {"symptoms": {}}
+
+
+def load_recordings_from_notes(doctor_notes_dir="data/doctor_notes/"):
+    """Recorded extractions keyed by note text, taken from already processed notes"""
+    recordings = {}
+    for path in glob.glob(os.path.join(doctor_notes_dir, "**", "*.json"), recursive=True):
+        try:
+            with open(path, "r") as file:
+                note = json.load(file)
+            recordings[note["doctor_note"]] = {"diagnosis": note["diagnosis"], "features": note["features"]}
+        except (IOError, json.JSONDecodeError, KeyError, TypeError):
+            continue
+    return recordings
+
+
+def classify_prompt(prompt):
+    # Recognise the call site from the fixed parts of each prompt
+    if '"features":{' in prompt and "clinical diagnosis" in prompt:
+        return "combined"
+    if "canonical_symptoms" in prompt:
+        return "symptom_mapping"
+    if "main clinical diagnosis" in prompt:
+        return "diagnosis"
+    if "name_of_symptom_including_location" in prompt or '{"symptoms": {"<symptom name' in prompt:
+        return "features"
+    if "analyzing patient symptom data" in prompt:
+        return "report_analysis"
+    if "Based on your analysis" in prompt:
+        return "report_summary"
+    return "other"
+
+
+class MockGroq:
+    def __init__(self, recordings=None, latency=0.0, jitter=0.0, error_rate=0.0, malformed_rate=0.0, seed=None):
+        self.recordings = recordings if recordings is not None else {}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    def _recording_for(self, prompt):
+        for note_text, recording in self.recordings.items():
+            if note_text and note_text in prompt:
+                return recording
+        return None
+
+    def respond(self, prompt):
+        kind = classify_prompt(prompt)
+        with self.lock:
+            self.calls[kind] += 1
+        recording = self._recording_for(prompt) or {"diagnosis": DEFAULT_DIAGNOSIS, "features": DEFAULT_FEATURES}
+
+        if kind == "diagnosis":
+            return kind, json.dumps(recording["diagnosis"], indent=2)
+        if kind == "features":
+            return kind, json.dumps(recording["features"], indent=2)
+        if kind == "combined":
+            return kind, json.dumps(recording, indent=2)
+        if kind == "symptom_mapping":
+            # Identity mapping: every new symptom becomes its own canonical symptom
+            request_json = prompt.rsplit("INPUT:", 1)[-1].split("OUTPUT:")[0]
+            mapping = {}
+            if "new_notes" in request_json:
+                for note_file, names in json.loads(request_json).get("new_notes", {}).items():
+                    for name in names:
+                        mapping.setdefault(name, {})[note_file] = name
+            return kind, json.dumps({"symptoms": mapping})
+        if kind == "report_analysis":
+            return kind, "1. Trend analysis: symptoms are stable.\n2. No concerning patterns.\n3. No correlations.\n4. Within typical ranges."
+        if kind == "report_summary":
+            return kind, "The patient's health trajectory is stable. Continue monitoring at future visits."
+        return kind, "{}"
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+
+    def stats(self):
+        with self.lock:
+            return {"calls": dict(self.calls), "total": sum(self.calls.values())}
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear()
+
+
+def completion_body(model, content, prompt_tokens):
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop", "logprobs": None}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                return self._send_json(200, mock.stats())
+            self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/reset":
+                mock.reset()
+                return self._send_json(200, {"ok": True})
+            if not self.path.endswith("/chat/completions"):
+                return self._send_json(404, {"error": {"message": "not found"}})
+
+            prompt = "\n".join(message.get("content", "") for message in request.get("messages", []))
+            mock.delay()
+            if mock.random.random() < mock.error_rate:
+                status = mock.random.choice([429, 500, 503])
+                return self._send_json(status, {"error": {"message": "injected error", "type": "mock_error"}})
+
+            kind, content = mock.respond(prompt)
+            if mock.random.random() < mock.malformed_rate:
+                content = content[: max(1, len(content) // 2)]  # truncated, unparseable JSON
+
+            model = request.get("model", "mock")
+            if request.get("stream"):
+                return self._stream(model, content, len(prompt) // 4)
+            self._send_json(200, completion_body(model, content, len(prompt) // 4))
+
+        def _stream(self, model, content, prompt_tokens):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+            pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+            for index, piece in enumerate(pieces):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+                if index == len(pieces) - 1:
+                    chunk["choices"][0]["finish_reason"] = "stop"
+                    chunk["x_groq"] = {"id": completion_id, "usage": completion_body(model, content, prompt_tokens)["usage"]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+
+def start_server(mock, host="127.0.0.1", port=0):
+    """Start the mock in a daemon thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(mock))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--notes-dir", default="data/doctor_notes/", help="notes whose extractions are replayed")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429/5xx")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of calls answered with truncated JSON")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    mock = MockGroq(load_recordings_from_notes(args.notes_dir), args.latency, args.jitter, args.error_rate, args.malformed_rate, args.seed)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(mock))
+    print(f"Mock Groq listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
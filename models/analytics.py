@@ -1,19 +1,274 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
 
-def visualize_symptoms(df):
+# heatmap: one smoothed heatmap per symptom; shapes: 20 rectangles per segment
+GRADIENT_MODE = os.environ.get("ANALYTICS_GRADIENT_MODE", "heatmap")
+# Point budget of a timeline figure; longer histories are downsampled (0 disables)
+TIMELINE_MAX_POINTS = int(os.environ.get("TIMELINE_MAX_POINTS", "2000"))
+# svg: go.Scatter; webgl: go.Scattergl with heatmap gradients; auto: webgl above TIMELINE_WEBGL_THRESHOLD points
+TIMELINE_RENDER_MODE = os.environ.get("TIMELINE_RENDER_MODE", "auto")
+TIMELINE_WEBGL_THRESHOLD = int(os.environ.get("TIMELINE_WEBGL_THRESHOLD", "1000"))
+# Same stops as the marker color scale, at the transparency of the gradient bands
+GRADIENT_COLOR_SCALE = [
+    [0, 'rgba(0,255,0,0.35)'],
+    [0.25, 'rgba(173,255,47,0.35)'],
+    [0.5, 'rgba(255,255,0,0.35)'],
+    [0.75, 'rgba(255,165,0,0.35)'],
+    [1, 'rgba(255,0,0,0.35)']
+]
+
+
+FIGURE_CACHE_MAX_ENTRIES = int(os.environ.get("FIGURE_CACHE_MAX_ENTRIES", "64"))
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get("FIGURE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def frame_fingerprint(df):
+    """Content hash of a DataFrame: column names, dtypes and every row"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode("utf-8"))
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    except TypeError:
+        # Unhashable cells (lists, dicts): hash the serialized rows instead
+        digest.update(df.to_json(orient="values", date_format="iso").encode("utf-8"))
+    return digest.hexdigest()
+
+
+class FigureCache:
+    """In-process LRU of Plotly figures, stored as their JSON and keyed by (kind, content fingerprint).
+
+    Memory is bounded by the summed size of the serialized figures. Hits are rebuilt without
+    re-validating the stored (already valid) JSON, so callers must treat them as read-only.
+    """
+
+    def __init__(self, max_entries=FIGURE_CACHE_MAX_ENTRIES, max_bytes=FIGURE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # (kind, fingerprint) -> figure JSON, least recently used first
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+    def get_or_build(self, kind, fingerprint, build):
+        """Return the cached figure for (kind, fingerprint), calling `build()` only on a miss"""
+        key = (kind, fingerprint)
+        with self.lock:
+            figure_json = self._entries.get(key)
+            if figure_json is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if figure_json is not None:
+            return go.Figure(json.loads(figure_json), _validate=False)
+
+        figure = build()
+        if figure is not None:
+            self.put(key, figure.to_json())
+        return figure
+
+    def put(self, key, figure_json):
+        size = len(figure_json)
+        with self.lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= len(previous)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = figure_json
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+
+figure_cache = FigureCache()
+
+
+def use_webgl(point_count):
+    return TIMELINE_RENDER_MODE == "webgl" or (TIMELINE_RENDER_MODE == "auto" and point_count > TIMELINE_WEBGL_THRESHOLD)
+
+
+def scatter_trace(point_count):
+    """Scatter trace class for a figure of `point_count` points: WebGL for dense figures"""
+    return go.Scattergl if use_webgl(point_count) else go.Scatter
+
+
+def downsample_timeline(df, max_points=TIMELINE_MAX_POINTS, date_range=None):
+    """Observations to plot when `df` has more than `max_points` rows, as a subset of its rows.
+
+    Each symptom's history is split into time buckets sized from `date_range` (default: the
+    dates in `df`) and the point budget; a bucket keeps its first, last, lowest and highest
+    intensity observation (min/max/first/last). Buckets never span an active/inactive change,
+    so every transition, and with it every drawn or broken segment, is kept exactly. Only
+    histories that switch status more often than the budget allows stay above it.
+    """
+    if not max_points or len(df) <= max_points:
+        return df
+    dates = pd.to_datetime(df['date'])
+    start, end = date_range if date_range is not None else (dates.min(), dates.max())
+    buckets_per_symptom = max(1, max_points // (4 * max(1, df['symptom'].nunique())))
+    width = max((pd.Timestamp(end) - pd.Timestamp(start)) / buckets_per_symptom, pd.Timedelta(seconds=1))
+
+    frame = pd.DataFrame({
+        'symptom': df['symptom'].to_numpy(),
+        'date': dates.to_numpy(),
+        'is_active': df['is_active'].to_numpy(dtype=bool),
+        'intensity': pd.to_numeric(df['intensity'], errors='coerce').to_numpy(dtype=float),
+        'position': np.arange(len(df)),
+    }).sort_values(['symptom', 'date'], kind='stable')
+    new_symptom = frame['symptom'].ne(frame['symptom'].shift())
+    run = (new_symptom | frame['is_active'].ne(frame['is_active'].shift())).cumsum()
+    bucket = ((frame['date'] - pd.Timestamp(start)) // width).astype(np.int64)
+    groups = frame.groupby([run, bucket], sort=False)
+
+    keep = np.concatenate([
+        groups['position'].first().to_numpy(),
+        groups['position'].last().to_numpy(),
+        # Unmentioned intensities never win a bucket's min or max
+        frame.loc[frame['intensity'].fillna(-np.inf).groupby([run, bucket], sort=False).idxmax(), 'position'].to_numpy(),
+        frame.loc[frame['intensity'].fillna(np.inf).groupby([run, bucket], sort=False).idxmin(), 'position'].to_numpy(),
+    ])
+    return df.iloc[np.unique(keep)]
+
+
+def segment_table(df):
+    """One row per pair of consecutive active points of a symptom, built in a single vectorized pass.
+
+    Columns: symptom, start, end, start_intensity, end_intensity and drawable, which is False
+    when the symptom was reported inactive strictly between the two dates. Rows are ordered by
+    symptom (in order of first active appearance) and date.
+    """
+    codes, _ = pd.factorize(df['symptom'])
+    # Dense date ranks keep (symptom, date) sort keys small enough to combine into one integer
+    _, date_ranks = np.unique(df['date'].to_numpy(), return_inverse=True)
+    keys = codes.astype(np.int64) * (int(date_ranks.max(initial=0)) + 1) + date_ranks
+    is_active = df['is_active'].to_numpy(dtype=bool)
+    inactive_keys = np.sort(keys[~is_active])
+
+    active = df[is_active]
+    active_codes, _ = pd.factorize(active['symptom'])
+    # Stable sort by symptom (first active appearance), then date
+    positions = np.lexsort((keys[is_active], active_codes))
+    symptoms = active['symptom'].to_numpy()[positions]
+    dates = active['date'].to_numpy()[positions]
+    intensities = active['intensity'].to_numpy(dtype=float)[positions]
+    point_keys = keys[is_active][positions]
+
+    pairs = active_codes[positions][:-1] == active_codes[positions][1:]
+    start_keys, end_keys = point_keys[:-1][pairs], point_keys[1:][pairs]
+    # Inactive observations strictly between the two points, counted on the sorted inactive keys;
+    # the count is negative when both points and an inactive one share a date (nothing is between)
+    inactive_between = np.searchsorted(inactive_keys, end_keys, side='left') - np.searchsorted(inactive_keys, start_keys, side='right')
+    return pd.DataFrame({
+        'symptom': symptoms[:-1][pairs],
+        'start': dates[:-1][pairs],
+        'end': dates[1:][pairs],
+        'start_intensity': intensities[:-1][pairs],
+        'end_intensity': intensities[1:][pairs],
+        'drawable': inactive_between <= 0,
+    })
+
+
+def drawable_runs(drawable):
+    """(first, last) segment indices, end exclusive, of each run of consecutive drawable segments"""
+    edges = np.diff(np.concatenate([[0], np.asarray(drawable, dtype=np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def add_gradient_heatmaps(fig, segments, y_position):
+    """Draw the intensity gradient of a symptom's drawable segments as a single smoothed heatmap.
+
+    Runs of connected points are separated by empty (null) columns, which the smoothed
+    heatmap leaves transparent, so one trace per symptom draws every band.
+    """
+    starts = list(segments['start'])
+    ends = list(segments['end'])
+    start_intensities = list(segments['start_intensity'])
+    end_intensities = list(segments['end_intensity'])
+    all_x, all_z = [], []
+    for first, last in drawable_runs(segments['drawable']):
+        x = starts[first:last] + [ends[last - 1]]
+        z = [0 if pd.isna(value) else value for value in start_intensities[first:last] + [end_intensities[last - 1]]]
+        # A smoothed heatmap extends half a column past its first and last x; near-zero-width
+        # end columns keep the band between the first and last point
+        epsilon = (x[-1] - x[0]) / 10000
+        x = [x[0]] + [x[0] + epsilon] + x[1:-1] + [x[-1] - epsilon] + [x[-1]]
+        z = [z[0]] + [z[0] + (z[1] - z[0]) / 10000] + z[1:-1] + [z[-1] - (z[-1] - z[-2]) / 10000] + [z[-1]]
+        if all_x:
+            # The previous run's color holds up to the null column, which starts the gap
+            gap = all_x[-1] + min((x[0] - all_x[-1]) / 2, epsilon)
+            all_x.append(gap)
+            all_z.append(None)
+        all_x += x
+        all_z += z
+    if not all_x:
+        return
+    fig.add_trace(
+        go.Heatmap(
+            x=all_x,
+            # Row edges: the band spans exactly y_position ± 0.35
+            y=[y_position - 0.35, y_position, y_position + 0.35],
+            z=[all_z, all_z],
+            zmin=0,
+            zmax=1,
+            zsmooth='best',
+            connectgaps=False,
+            colorscale=GRADIENT_COLOR_SCALE,
+            showscale=False,
+            hoverinfo='skip',
+            showlegend=False
+        )
+    )
+
+
+def visualize_symptoms(df, use_cache=True):
     if df.empty:
         return None
+    if use_cache:
+        # Built on a copy: the coercions below would otherwise change the fingerprint of the caller's frame
+        return figure_cache.get_or_build(
+            ("symptom_timeline", GRADIENT_MODE), frame_fingerprint(df), lambda: visualize_symptoms(df.copy(), use_cache=False)
+        )
 
-    # Ensure 'is_active' is of boolean type
-    df['is_active'] = df['is_active'].astype(bool) # TODO: Use typing
-    # Convert 'intensity' to numeric type
-    df['intensity'] = pd.to_numeric(df['intensity'], errors='coerce')
+    # The symptom table arrives typed (bool is_active, numeric intensity); only coerce untyped input
+    if not pd.api.types.is_bool_dtype(df['is_active']):
+        df['is_active'] = df['is_active'].astype(bool)
+    if not pd.api.types.is_numeric_dtype(df['intensity']):
+        df['intensity'] = pd.to_numeric(df['intensity'], errors='coerce')
     df['date'] = pd.to_datetime(df['date'])
     
     # Size of X-axis
     date_range = df['date'].agg(['min', 'max'])
+    df = downsample_timeline(df, date_range=(date_range['min'], date_range['max']))
     active_symptoms = df[df['is_active']].copy()
 
     color_scale = [
@@ -64,40 +319,40 @@ def visualize_symptoms(df):
     unique_symptoms = active_symptoms['symptom'].unique()
     symptom_positions = {symptom: i for i, symptom in enumerate(unique_symptoms)}
 
+    segments = segment_table(df)
+    webgl = use_webgl(len(df))
+    # Layout shapes are SVG and stall the browser in dense figures, so WebGL always uses heatmaps
+    gradient_mode = "heatmap" if webgl else GRADIENT_MODE
+    segments_by_symptom = dict(tuple(segments.groupby('symptom', sort=False)))
+    active_by_symptom = dict(tuple(active_symptoms.sort_values('date', kind='stable').groupby('symptom', sort=False)))
+
     # Add traces for each symptom with enhanced styling
     for symptom in unique_symptoms:
-        mask = active_symptoms['symptom'] == symptom
-        symptom_data = active_symptoms[mask].sort_values('date')
+        symptom_data = active_by_symptom[symptom]
+        symptom_segments = segments_by_symptom.get(symptom, segments.iloc[:0])
         y_position = symptom_positions[symptom]
-        
-        # Add connecting gradient shapes with glowing effect
-        for i in range(len(symptom_data)-1):
-            # Get the next point in the original dataset after current point
-            current_date = symptom_data['date'].iloc[i]
-            next_date = symptom_data['date'].iloc[i+1]
-            
-            # Find any inactive points between these dates
-            inactive_between = df[
-                (df['symptom'] == symptom) & 
-                (df['date'] > current_date) & 
-                (df['date'] < next_date) & 
-                (~df['is_active'])
-            ]
-            
-            # Only add the colored boxes if there are no inactive points between
-            if len(inactive_between) == 0:
+
+        # A segment between consecutive active points is drawn only if the symptom was not
+        # reported inactive in between
+        if gradient_mode == "heatmap":
+            add_gradient_heatmaps(fig, symptom_segments, y_position)
+        else:
+            # Add connecting gradient shapes with glowing effect
+            for segment in symptom_segments[symptom_segments['drawable']].itertuples(index=False):
+                current_date = segment.start
+                next_date = segment.end
                 # Create multiple small rectangles to create a smooth gradient effect
                 num_steps = 20  # Number of gradient steps
-                start_intensity = symptom_data['intensity'].iloc[i]
-                end_intensity = symptom_data['intensity'].iloc[i+1]
-                
+                start_intensity = segment.start_intensity
+                end_intensity = segment.end_intensity
+
                 for step in range(num_steps):
                     # Calculate the position and intensity for this step
                     x0 = current_date + (next_date - current_date) * (step/num_steps)
                     x1 = current_date + (next_date - current_date) * ((step+1)/num_steps)
                     intensity = start_intensity + (end_intensity - start_intensity) * (step/num_steps)
-                    
-                    
+
+
                     fig.add_shape(
                         type="rect",
                         x0=x0,
@@ -108,9 +363,9 @@ def visualize_symptoms(df):
                         line=dict(width=0),
                         layer='below'
                     )
-        
+
         fig.add_trace(
-            go.Scatter(
+            (go.Scattergl if webgl else go.Scatter)(
                 x=symptom_data['date'],
                 y=[y_position] * len(symptom_data),
                 mode='markers+lines',
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+
+MULTI_NOTE_INSTRUCTION = """
+
+    There are {count} cases above. Return ONE JSON object whose keys are the case numbers ("1", "2", ...) and whose values are the output for that case in the format described above.
+
+    OUTPUT JSON:
+    """
+
+
+def note_key(doctor_note):
+    return hashlib.sha1(doctor_note.encode("utf-8")).hexdigest()
+
+
+def build_multi_note_prompt(preamble, doctor_notes):
+    # Several notes share one copy of the (long) instruction preamble
+    prompt = preamble
+    for number, doctor_note in enumerate(doctor_notes, 1):
+        prompt += f"CASE {number}: {doctor_note}\n    "
+    prompt += MULTI_NOTE_INSTRUCTION.format(count=len(doctor_notes))
+    return prompt
+
+
+def parse_multi_note_result(result, count):
+    """Split a multi-note answer into per-note results; None for every note that is missing"""
+    try:
+        parsed = json.loads(result)
+    except json.JSONDecodeError:
+        return [None] * count
+    if not isinstance(parsed, dict):
+        return [None] * count
+    return [parsed.get(str(number)) if isinstance(parsed.get(str(number)), dict) else None for number in range(1, count + 1)]
+
+
+class BatchCheckpoint:
+    """Append-only JSONL record of finished notes, so an interrupted batch resumes where it stopped"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.results = {}
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line of a crashed run
+                    self.results[entry["index"]] = (entry["key"], entry["result"])
+
+    def get(self, index, doctor_note):
+        # Only reuse a result if the note at this position is still the same note
+        key, result = self.results.get(index, (None, None))
+        return result if key == note_key(doctor_note) else None
+
+    def add(self, index, doctor_note, result):
+        if "error" in result:
+            return  # failed notes are retried on the next run
+        line = json.dumps({"index": index, "key": note_key(doctor_note), "result": result})
+        with self.lock:
+            with open(self.path, "a") as file:
+                file.write(line + "\n")
+
+
+def extract_batch(doctor_notes, extract_one, extract_many=None, concurrency=4, notes_per_prompt=1, checkpoint_path=None):
+    """Run an extractor over many notes with bounded concurrency, yielding results in input order.
+
+    `extract_one(note)` handles a single note. With `notes_per_prompt > 1`, `extract_many(notes)`
+    handles a group of notes in one call and returns one result (or None) per note; notes it
+    could not answer fall back to `extract_one`.
+    """
+    checkpoint = BatchCheckpoint(checkpoint_path) if checkpoint_path else None
+    if extract_many is None:
+        notes_per_prompt = 1
+
+    def process(group):
+        results = [None] * len(group)
+        if len(group) > 1:
+            try:
+                results = extract_many([doctor_note for _, doctor_note in group])
+            except Exception as e:
+                # A failed group call (rate limit, network) must not end the batch: retry per note
+                print(f"Group extraction failed, falling back to single notes: {str(e)}")
+        results = [result if result is not None else extract_one(doctor_note) for (_, doctor_note), result in zip(group, results)]
+        if checkpoint:
+            for (index, doctor_note), result in zip(group, results):
+                checkpoint.add(index, doctor_note, result)
+        return results
+
+    def collect(entry):
+        chunk, cached, future = entry
+        computed = iter(future.result()) if future else iter(())
+        return [cached[index] if index in cached else next(computed) for index, _ in chunk]
+
+    notes = enumerate(doctor_notes)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+        while True:
+            chunk = list(islice(notes, notes_per_prompt))
+            if not chunk:
+                break
+            cached = {}
+            if checkpoint:
+                for index, doctor_note in chunk:
+                    result = checkpoint.get(index, doctor_note)
+                    if result is not None:
+                        cached[index] = result
+            todo = [(index, doctor_note) for index, doctor_note in chunk if index not in cached]
+            pending.append((chunk, cached, executor.submit(process, todo) if todo else None))
+
+            # Keep a bounded number of groups in flight and stream finished ones in order
+            while len(pending) > concurrency:
+                yield from collect(pending.popleft())
+
+        while pending:
+            yield from collect(pending.popleft())
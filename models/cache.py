@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+CACHE_DIR = os.environ.get("LLM_CACHE_DIR", "data/cache/completions/")
+CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_MAX_AGE = float(os.environ.get("LLM_CACHE_MAX_AGE", str(30 * 24 * 3600)))  # seconds
+CACHE_DISABLED = os.environ.get("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+
+def completion_key(model, messages, params):
+    """Content address of a completion request: hash of model, messages and parameters"""
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """Persistent LLM completion cache, one JSON file per key, with LRU, size and age eviction"""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # key -> (size in bytes, last access time); loaded lazily from disk
+        self._index = None
+        self._total_bytes = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        self._total_bytes = 0
+        if not os.path.isdir(self.cache_dir):
+            return
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                self._index[entry.name[:-5]] = (stat.st_size, stat.st_mtime)
+                self._total_bytes += stat.st_size
+
+    def _remove(self, key):
+        size, _ = self._index.pop(key, (0, 0))
+        self._total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        if len(self._index) <= self.max_entries and self._total_bytes <= self.max_bytes:
+            return
+        # Least recently used first
+        for key, _ in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if len(self._index) <= self.max_entries and self._total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+    def get(self, key):
+        """Return the cached content for `key`, or None on a miss"""
+        with self.lock:
+            self._load_index()
+            if key not in self._index:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "r") as file:
+                    entry = json.load(file)
+            except (IOError, json.JSONDecodeError):
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            if time.time() - entry["created_at"] > self.max_age:
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            # Touch the entry so that LRU order survives restarts
+            now = time.time()
+            os.utime(self._path(key), (now, now))
+            self._index[key] = (self._index[key][0], now)
+            self.hits += 1
+            return entry["content"]
+
+    def put(self, key, model, content):
+        """Store a completion; written to a temporary file first so readers never see partial entries"""
+        entry = json.dumps({"model": model, "created_at": time.time(), "content": content})
+        with self.lock:
+            self._load_index()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w") as file:
+                file.write(entry)
+            os.replace(temp_path, self._path(key))
+
+            old_size, _ = self._index.get(key, (0, 0))
+            size = len(entry.encode("utf-8"))
+            self._index[key] = (size, time.time())
+            self._total_bytes += size - old_size
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self._load_index()
+            for key in list(self._index):
+                self._remove(key)
+
+    def stats(self):
+        with self.lock:
+            self._load_index()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+            }
+
+
+completion_cache = CompletionCache()
+
+
+NOTE_CACHE_MAX_ENTRIES = int(os.environ.get("NOTE_CACHE_MAX_ENTRIES", "2048"))
+NOTE_CACHE_MAX_BYTES = int(os.environ.get("NOTE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class ParsedNoteCache:
+    """In-process LRU of parsed note files, validated against the file's (mtime, size) on every read.
+
+    Memory is bounded by the summed size of the cached files. Cached documents are shared,
+    so callers must treat them as read-only.
+    """
+
+    def __init__(self, max_entries=NOTE_CACHE_MAX_ENTRIES, max_bytes=NOTE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # path -> (signature, size, document), least recently used first
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+    def _signature(self, path, companions=()):
+        # (mtime, size) of the file and of any companion files whose content is folded into the document
+        stat = os.stat(path)
+        signature = [(stat.st_mtime_ns, stat.st_size)]
+        for companion in companions:
+            try:
+                stat = os.stat(companion)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def get(self, path, load, companions=()):
+        """Return the parsed document at `path`, calling `load(path)` only if the file (or a companion) changed"""
+        path = os.path.normpath(path)
+        signature = self._signature(path, companions)
+        with self.lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        document = load(path)
+        self.put(path, document, signature)
+        return document
+
+    def put(self, path, document, signature=None, companions=()):
+        path = os.path.normpath(path)
+        signature = signature or self._signature(path, companions)
+        size = sum(part[1] for part in signature if part)
+        with self.lock:
+            self._discard(path)
+            if size > self.max_bytes:
+                return
+            self._entries[path] = (signature, size, document)
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+
+    def _discard(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def invalidate(self, path):
+        with self.lock:
+            self._discard(os.path.normpath(path))
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
@@ -0,0 +1,152 @@
+"""Indexed catalog of doctor notes, so listing a patient's notes does not scan the notes directory.
+
+    python -m models.catalog rebuild     # re-index data/doctor_notes/ from scratch
+"""
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+
+DOCTOR_NOTES_DIR = 'data/doctor_notes/'
+CATALOG_PATH = os.environ.get("NOTE_CATALOG_PATH", 'data/note_catalog.sqlite')
+NOTE_FILENAME_PATTERN = re.compile(r'doctor_note_(\d{8})_(\d{6})_(\d+)_(\d+)\.json$')
+
+
+def parse_note_filename(filename):
+    """Return (doctor_id, patient_id, note_date) for 'doctor_note_yyyymmdd_hhmmss_doctorid_patientid.json'"""
+    match = NOTE_FILENAME_PATTERN.search(os.path.basename(filename))
+    if not match:
+        return None
+    day, clock, doctor_id, patient_id = match.groups()
+    note_date = f"{day[:4]}-{day[4:6]}-{day[6:]}T{clock[:2]}:{clock[2:4]}:{clock[4:]}"
+    return doctor_id, patient_id, note_date
+
+
+class NoteCatalog:
+    def __init__(self, path=CATALOG_PATH, doctor_notes_dir=DOCTOR_NOTES_DIR):
+        self.doctor_notes_dir = doctor_notes_dir
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS notes (
+                    file_name TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    doctor_id TEXT NOT NULL,
+                    patient_id TEXT NOT NULL,
+                    note_date TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )"""
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS notes_by_patient ON notes (doctor_id, patient_id, created_at)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS notes_by_date ON notes (doctor_id, patient_id, note_date)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS notes_by_created ON notes (created_at)")
+            empty = self.connection.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 0
+        if empty:
+            # First use: index the notes that already exist on disk
+            self.rebuild()
+
+    def _row(self, path):
+        parsed = parse_note_filename(path)
+        if parsed is None:
+            return None
+        doctor_id, patient_id, note_date = parsed
+        return (os.path.basename(path), path, doctor_id, patient_id, note_date, os.path.getctime(path))
+
+    def add_note(self, path):
+        """Index a note that was just written"""
+        row = self._row(path)
+        if row is None:
+            return
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?, ?)", row)
+
+    def move_note(self, path, new_path):
+        """Point a note at its new location, keeping its creation time (a rename changes the ctime)"""
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE notes SET path = ? WHERE file_name = ?", (new_path, os.path.basename(path)))
+
+    def remove_note(self, path):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM notes WHERE file_name = ?", (os.path.basename(path),))
+
+    def rebuild(self):
+        """Re-index every note in the notes directory"""
+        rows = []
+        if os.path.isdir(self.doctor_notes_dir):
+            for root, _, filenames in os.walk(self.doctor_notes_dir):
+                for filename in filenames:
+                    row = self._row(os.path.join(root, filename))
+                    if row is not None:
+                        rows.append(row)
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM notes")
+            self.connection.executemany("INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def all_notes(self):
+        """Paths of every indexed note, oldest first"""
+        with self.lock:
+            rows = self.connection.execute("SELECT path FROM notes ORDER BY created_at").fetchall()
+        return [row[0] for row in rows]
+
+    def notes_of_patient(self, doctor_id, patient_id):
+        """Paths of a patient's notes, most recent first"""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT path FROM notes WHERE doctor_id = ? AND patient_id = ? ORDER BY created_at DESC",
+                (str(doctor_id), str(patient_id)),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def latest_note(self, doctor_id=None, patient_id=None):
+        """Path of the most recently written note, optionally restricted to a doctor/patient"""
+        query = "SELECT path FROM notes"
+        conditions, parameters = [], []
+        if doctor_id is not None:
+            conditions.append("doctor_id = ?")
+            parameters.append(str(doctor_id))
+        if patient_id is not None:
+            conditions.append("patient_id = ?")
+            parameters.append(str(patient_id))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC LIMIT 1"
+        with self.lock:
+            row = self.connection.execute(query, parameters).fetchone()
+        return row[0] if row else None
+
+    def notes_in_range(self, doctor_id, patient_id, start_date, end_date):
+        """Paths of a patient's notes dated within [start_date, end_date] (ISO dates), oldest first"""
+        end_date = str(end_date)
+        if len(end_date) == 10:
+            end_date += "T23:59:59"
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT path FROM notes WHERE doctor_id = ? AND patient_id = ? AND note_date BETWEEN ? AND ? ORDER BY note_date",
+                (str(doctor_id), str(patient_id), str(start_date), end_date),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+_note_catalog = None
+_note_catalog_lock = threading.Lock()
+
+
+def get_note_catalog():
+    global _note_catalog
+    if _note_catalog is None:
+        with _note_catalog_lock:
+            if _note_catalog is None:
+                _note_catalog = NoteCatalog()
+    return _note_catalog
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["rebuild"]:
+        print(f"Indexed {get_note_catalog().rebuild()} notes")
+    else:
+        print(__doc__)
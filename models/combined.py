@@ -0,0 +1,137 @@
+import json
+import time
+from models.llm import chat_completion
+
+
+COMBINED_PROMPT = """You are a medical expert that ONLY TALKS IN JSON. Given a doctor appointment-note, extract both the main clinical diagnosis and the medical symptoms mentioned in the note.
+    For the diagnosis: return only the main clinical diagnosis that can be found given the information. If the clinical diagnosis is very unclear, return 'unknown', if the text is unrelated to a medical diagnosis, then return 'unrelated'.
+    For the symptoms: intensity is an integer between 0 and 10 (-1 if not mentioned), is_active is "False" ONLY if explicit reference is made to that symptom having ceased, location is an empty string if not applicable.
+    The JSON should follow the following FORMAT:
+    {
+        "diagnosis":{
+            "diagnosis":"the clinical diagnosis",
+            "reasoning":"a brief and concise explanation of the pointers that led to the diagnosis"
+        },
+        "features":{
+            "symptoms":{
+                "name_of_symptom_including_location":{
+                    "description":"short description of the symptom within the context of the note",
+                    "location":"location of the symptom on the body",
+                    "intensity":"integer intensity of the symptom",
+                    "is_active":"True or False",
+                    "raw_data":"the region in the text where the symptom is mentioned"
+                }
+            }
+        }
+    }
+
+    Don't return anything but the diagnosis and symptoms in the valid JSON FORMAT. Here is an example of what you should OUTPUT:
+
+    EXAMPLE INPUT NOTE:
+    The patient describes a dull, aching pain in the lumbar region, radiating to the right hip, with intermittent numbness in the right leg. He said the pain in the lumbar region is moderate.
+    The patient says headaches have stopped.
+
+    EXAMPLE OUTPUT JSON:
+    {
+        "diagnosis":{
+            "diagnosis":"lumbar radiculopathy",
+            "reasoning":"Lumbar pain radiating to the right hip with numbness in the right leg."
+        },
+        "features":{
+            "symptoms":{
+                "lumbar pain":{
+                    "description":"Dull, aching pain in the lumbar region, radiating to the right hip.",
+                    "location":"lumbar region",
+                    "intensity":"6",
+                    "is_active":"True",
+                    "raw_data":"The patient describes a dull, aching pain in the lumbar region, radiating to the right hip"
+                },
+                "right leg numbness":{
+                    "description":"Intermittent numbness in the right leg.",
+                    "location":"right leg",
+                    "intensity":"-1",
+                    "is_active":"True",
+                    "raw_data":"with intermittent numbness in the right leg."
+                },
+                "headache":{
+                    "description":"Headaches have stopped.",
+                    "location":"head",
+                    "intensity":"-1",
+                    "is_active":"False",
+                    "raw_data":"The patient says headaches have stopped."
+                }
+            }
+        }
+    }
+
+    INPUT NOTE:
+    """
+
+SYMPTOM_FIELDS = ["description", "location", "intensity", "is_active", "raw_data"]
+
+
+def build_prompt(doctor_note):
+    prompt = COMBINED_PROMPT
+
+    # User input
+    prompt += doctor_note
+
+    # Prepare system output
+    prompt += """
+
+    OUTPUT JSON:
+    """
+    return prompt
+
+
+def validate_combined(result):
+    """Split a combined answer into the diagnosis and features documents stored in a note.
+
+    Values are normalised to the string encoding the separate extractors produce
+    (e.g. intensity "6", is_active "True"). Raises ValueError if the structure is wrong.
+    """
+    if not isinstance(result, dict) or not isinstance(result.get("diagnosis"), dict) or not isinstance(result.get("features"), dict):
+        raise ValueError("expected 'diagnosis' and 'features' objects")
+
+    diagnosis = result["diagnosis"]
+    if not isinstance(diagnosis.get("diagnosis"), str):
+        raise ValueError("missing diagnosis")
+    diagnosis = {"diagnosis": diagnosis["diagnosis"], "reasoning": str(diagnosis.get("reasoning", ""))}
+
+    symptoms = result["features"].get("symptoms")
+    if not isinstance(symptoms, dict):
+        raise ValueError("missing symptoms")
+    features = {"symptoms": {}}
+    for name, symptom in symptoms.items():
+        if not isinstance(symptom, dict):
+            raise ValueError(f"symptom '{name}' is not an object")
+        features["symptoms"][name] = {
+            field: str(symptom[field]) if field in symptom else ("-1" if field in ("location", "intensity") else "")
+            for field in SYMPTOM_FIELDS
+        }
+        features["symptoms"][name]["is_active"] = features["symptoms"][name]["is_active"].capitalize() or "True"
+    return diagnosis, features
+
+
+def validate_completion(content):
+    """`validate` for combined completions: raises unless the text parses and validates"""
+    validate_combined(json.loads(content.strip()))
+
+
+def extract_combined(doctor_note, max_retries=3, retry_delay=2, use_cache=True):
+    """Extract diagnosis and features in one call; returns (diagnosis, features) or None if it keeps failing"""
+    prompt = build_prompt(doctor_note)
+
+    for attempt in range(max_retries):
+        try:
+            # A retry must not be served the same cached (invalid) completion
+            result = chat_completion(prompt, use_cache=use_cache, refresh_cache=attempt > 0, call_site="combined", validate=validate_completion).strip()
+            return validate_combined(json.loads(result))
+
+        except Exception as e:
+            # Invalid answers and API errors (rate limits, connection failures) are both retried
+            print(f"Attempt {attempt + 1} failed ({e}). Retrying in {retry_delay} seconds...")
+            if attempt + 1 < max_retries:
+                time.sleep(retry_delay)
+
+    return None
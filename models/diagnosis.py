@@ -1,12 +1,11 @@
-from groq import Groq
 import json
+import os
 import time
+from models.batch import build_multi_note_prompt, extract_batch, parse_multi_note_result
+from models.llm import chat_completion, validate_json
 
 
-def extract_diagnosis(doctor_note, max_retries=3, retry_delay=2):
-    client = Groq(api_key="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")
- 
-    prompt = """You are a medical expert that ONLY TALKS IN JSON. Given a medical case description, extract and return only the main clinical diagnosis that can be found given the information. If the clinical diagnosis is very unclear, return 'unknown', if the text is unrelated to a medical diagnosis, then return 'unrelated'. DON'T RETURN ANYTHING ELSE BUT THE CLINICAL DIAGNOSIS.
+DIAGNOSIS_PROMPT = """You are a medical expert that ONLY TALKS IN JSON. Given a medical case description, extract and return only the main clinical diagnosis that can be found given the information. If the clinical diagnosis is very unclear, return 'unknown', if the text is unrelated to a medical diagnosis, then return 'unrelated'. DON'T RETURN ANYTHING ELSE BUT THE CLINICAL DIAGNOSIS.
     The clinical diagnosis should be a single, concise diagnosis given in the following JSON format:
     {
         "diagnosis": "the clinical diagnosis",
@@ -64,7 +63,20 @@ def extract_diagnosis(doctor_note, max_retries=3, retry_delay=2):
     
     INPUT:
     """
- 
+
+# Trimmed variant: schema-only instruction and a single short example
+COMPACT_DIAGNOSIS_PROMPT = """You are a medical expert that ONLY TALKS IN JSON. Return the main clinical diagnosis of the CASE as {"diagnosis": "concise diagnosis", "reasoning": "brief pointers that led to it"}. Use "unknown" with empty reasoning if the diagnosis is unclear, "unrelated" if the text is not a medical case.
+    EXAMPLE: CASE: Symptoms suggest asthma, but no response to bronchodilators; high-resolution CT of the chest is the next step. OUTPUT: {"diagnosis": "idiopathic pulmonary fibrosis", "reasoning": "Lack of response to bronchodilators, high-resolution CT of the chest."}
+
+    INPUT:
+    """
+
+PROMPT_VARIANTS = {"full": DIAGNOSIS_PROMPT, "compact": COMPACT_DIAGNOSIS_PROMPT}
+PROMPT_VARIANT = os.environ.get("EXTRACTION_PROMPT_VARIANT", "full")
+
+
+def build_prompt(doctor_note, variant=None):
+    prompt = PROMPT_VARIANTS[variant or PROMPT_VARIANT]
     prompt += f"CASE: {doctor_note}"
 
     # Prepare system output
@@ -72,15 +84,16 @@ def extract_diagnosis(doctor_note, max_retries=3, retry_delay=2):
     
     OUTPUT JSON:
     """
+    return prompt
+
+
+def extract_diagnosis(doctor_note, max_retries=3, retry_delay=2, use_cache=True, prompt_variant=None):
+    prompt = build_prompt(doctor_note, prompt_variant)
  
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.1-70b-versatile",
-            )
-
-            result = response.choices[0].message.content.strip()
+            # A retry must not be served the same cached (unparseable) completion
+            result = chat_completion(prompt, use_cache=use_cache, refresh_cache=attempt > 0, call_site="diagnosis", validate=validate_json).strip()
             features = json.loads(result)
             return features  # If successful, return the parsed JSON
 
@@ -107,4 +120,23 @@ def extract_diagnosis(doctor_note, max_retries=3, retry_delay=2):
             "message": "Unexpected error occurred.",
             "result": result,
         }
-    }
\ No newline at end of file
+    }
+
+
+def extract_diagnosis_multi(doctor_notes, use_cache=True, prompt_variant=None):
+    # One call for several notes; notes missing from the answer come back as None
+    prompt = build_multi_note_prompt(PROMPT_VARIANTS[prompt_variant or PROMPT_VARIANT], doctor_notes)
+    result = chat_completion(prompt, use_cache=use_cache, call_site="diagnosis_multi", validate=validate_json).strip()
+    return parse_multi_note_result(result, len(doctor_notes))
+
+
+def extract_diagnosis_batch(doctor_notes, concurrency=4, notes_per_prompt=1, checkpoint_path=None, use_cache=True, prompt_variant=None):
+    """Extract the diagnosis of many notes, yielding results in input order"""
+    return extract_batch(
+        doctor_notes,
+        lambda doctor_note: extract_diagnosis(doctor_note, use_cache=use_cache, prompt_variant=prompt_variant),
+        lambda notes: extract_diagnosis_multi(notes, use_cache=use_cache, prompt_variant=prompt_variant),
+        concurrency=concurrency,
+        notes_per_prompt=notes_per_prompt,
+        checkpoint_path=checkpoint_path,
+    )
@@ -0,0 +1,119 @@
+import json
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from models import combined, diagnosis, features
+from models.combined import extract_combined, validate_combined, validate_completion
+from models.diagnosis import extract_diagnosis
+from models.features import extract_features
+from models.llm import stream_chat_completion, validate_json
+from models.streaming import IncrementalJSONParser
+
+
+# Shared pool so both extractions of a note run side by side. Each extractor keeps
+# its own retry loop, so a retry in one call does not hold back the other.
+extraction_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="extraction")
+
+
+# "parallel": two concurrent calls; "combined": one call returning both documents,
+# which sends the note (and a single preamble) once instead of twice
+EXTRACTION_MODE = os.environ.get("EXTRACTION_MODE", "parallel")
+
+
+def extract_diagnosis_and_features(doctor_note, mode=None, executor=None):
+    """Extract the diagnosis and features of a note and return both results
+
+    Both calls run on `executor` (default: the shared extraction pool); bulk callers pass a
+    pool sized for their own concurrency.
+    """
+    executor = executor or extraction_executor
+    if (mode or EXTRACTION_MODE) == "combined":
+        combined = extract_combined(doctor_note)
+        if combined is not None:
+            return combined
+        print("Combined extraction failed, falling back to separate calls")
+
+    diagnosis_future = executor.submit(extract_diagnosis, doctor_note)
+    features_future = executor.submit(extract_features, doctor_note)
+
+    # Wait for both calls; total latency is that of the slower one
+    return diagnosis_future.result(), features_future.result()
+
+
+def stream_extraction(prompt, fallback, call_site="other", validate=validate_json):
+    """Yield (partial_document, False) while the completion streams in, then (result, True).
+
+    The final result is parsed from the complete text exactly like the non-streaming
+    extractors do; if it does not parse, `fallback()` (the retrying extractor) decides.
+    Only completions passing `validate` are cached.
+    """
+    parser = IncrementalJSONParser()
+    chunks = []
+    for chunk in stream_chat_completion(prompt, call_site=call_site, validate=validate):
+        chunks.append(chunk)
+        partial = parser.feed(chunk)
+        if partial is not None:
+            yield partial, False
+
+    try:
+        yield json.loads("".join(chunks).strip()), True
+    except json.JSONDecodeError:
+        yield fallback(), True
+
+
+def stream_combined(doctor_note):
+    # One streamed call carrying both documents
+    last = {}
+    document = None
+    try:
+        for document, is_final in stream_extraction(combined.build_prompt(doctor_note), lambda: None, call_site="combined", validate=validate_completion):
+            if not is_final:
+                for name in ("diagnosis", "features"):
+                    if isinstance(document.get(name), dict) and document[name] != last.get(name):
+                        last[name] = document[name]
+                        yield name, document[name], False
+    except Exception as e:
+        # Streaming failed midway (API or connection error); the separate extractors retry on their own
+        print(f"Streaming combined extraction failed: {str(e)}")
+        document = None
+
+    try:
+        diagnosis_result, features_result = validate_combined(document)
+    except ValueError:
+        print("Combined extraction failed, falling back to separate calls")
+        diagnosis_result, features_result = extract_diagnosis_and_features(doctor_note, mode="parallel")
+    yield "diagnosis", diagnosis_result, True
+    yield "features", features_result, True
+
+
+def stream_diagnosis_and_features(doctor_note, mode=None):
+    """Stream both extractions concurrently, yielding (name, document, is_final) as updates arrive"""
+    if (mode or EXTRACTION_MODE) == "combined":
+        yield from stream_combined(doctor_note)
+        return
+
+    events = queue.Queue()
+
+    def run(name, build_prompt, extract):
+        try:
+            for document, is_final in stream_extraction(build_prompt(doctor_note), lambda: extract(doctor_note), call_site=name):
+                events.put((name, document, is_final))
+        except Exception as e:
+            # Streaming failed midway; fall back to the regular extractor
+            print(f"Streaming {name} failed, falling back: {str(e)}")
+            try:
+                events.put((name, extract(doctor_note), True))
+            except Exception as fallback_error:
+                events.put((name, fallback_error, True))
+
+    extraction_executor.submit(run, "diagnosis", diagnosis.build_prompt, extract_diagnosis)
+    extraction_executor.submit(run, "features", features.build_prompt, extract_features)
+
+    remaining = 2
+    while remaining:
+        name, document, is_final = events.get()
+        if isinstance(document, Exception):
+            raise document
+        if is_final:
+            remaining -= 1
+        yield name, document, is_final
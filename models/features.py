@@ -1,13 +1,12 @@
-from groq import Groq
 import json
+import os
 import time
+from models.batch import build_multi_note_prompt, extract_batch, parse_multi_note_result
+from models.llm import chat_completion, validate_json
 
 
-def extract_features(doctor_note, max_retries=3, retry_delay=2):
-    client = Groq(api_key="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")
-
-    # System prompt
-    prompt = """You are an assistant that ONLY TALKS JSON. You are tasked with converting unstructured doctor appointment-notes into structured JSON format, containing information about medical symptoms. 
+# System prompt
+FEATURES_PROMPT = """You are an assistant that ONLY TALKS JSON. You are tasked with converting unstructured doctor appointment-notes into structured JSON format, containing information about medical symptoms. 
     The JSON should follow the following FORMAT:
         {
             "symptoms":{
@@ -72,6 +71,21 @@ def extract_features(doctor_note, max_retries=3, retry_delay=2):
     INPUT NOTE:
     """
 
+# Trimmed variant: schema-only instruction and a single short example
+COMPACT_FEATURES_PROMPT = """You are an assistant that ONLY TALKS JSON. Convert the doctor note into {"symptoms": {"<symptom name incl. location>": {"description": "...", "location": "body location or empty string", "intensity": "0-10, -1 if not mentioned", "is_active": "False ONLY if the symptom explicitly ceased, else True", "raw_data": "the text span mentioning it"}}}. All values are strings.
+    EXAMPLE NOTE: Dull lumbar pain, moderate. Headaches have stopped.
+    EXAMPLE OUTPUT: {"symptoms": {"lumbar pain": {"description": "Dull lumbar pain.", "location": "lumbar region", "intensity": "5", "is_active": "True", "raw_data": "Dull lumbar pain, moderate."}, "headache": {"description": "Headaches have stopped.", "location": "head", "intensity": "-1", "is_active": "False", "raw_data": "Headaches have stopped."}}}
+
+    INPUT NOTE:
+    """
+
+PROMPT_VARIANTS = {"full": FEATURES_PROMPT, "compact": COMPACT_FEATURES_PROMPT}
+PROMPT_VARIANT = os.environ.get("EXTRACTION_PROMPT_VARIANT", "full")
+
+
+def build_prompt(doctor_note, variant=None):
+    prompt = PROMPT_VARIANTS[variant or PROMPT_VARIANT]
+
     # TODO: Intensity has to be quantified
 
     # User input
@@ -82,15 +96,16 @@ def extract_features(doctor_note, max_retries=3, retry_delay=2):
     
     OUTPUT JSON:
     """
+    return prompt
+
+
+def extract_features(doctor_note, max_retries=3, retry_delay=2, use_cache=True, prompt_variant=None):
+    prompt = build_prompt(doctor_note, prompt_variant)
 
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model="llama-3.1-70b-versatile",
-            )
-
-            result = response.choices[0].message.content.strip()
+            # A retry must not be served the same cached (unparseable) completion
+            result = chat_completion(prompt, use_cache=use_cache, refresh_cache=attempt > 0, call_site="features", validate=validate_json).strip()
             features = json.loads(result)
             return features  # If successful, return the parsed JSON
 
@@ -118,3 +133,22 @@ def extract_features(doctor_note, max_retries=3, retry_delay=2):
             "result": result,
         }
     }
+
+
+def extract_features_multi(doctor_notes, use_cache=True, prompt_variant=None):
+    # One call for several notes; notes missing from the answer come back as None
+    prompt = build_multi_note_prompt(PROMPT_VARIANTS[prompt_variant or PROMPT_VARIANT], doctor_notes)
+    result = chat_completion(prompt, use_cache=use_cache, call_site="features_multi", validate=validate_json).strip()
+    return parse_multi_note_result(result, len(doctor_notes))
+
+
+def extract_features_batch(doctor_notes, concurrency=4, notes_per_prompt=1, checkpoint_path=None, use_cache=True, prompt_variant=None):
+    """Extract the features of many notes, yielding results in input order"""
+    return extract_batch(
+        doctor_notes,
+        lambda doctor_note: extract_features(doctor_note, use_cache=use_cache, prompt_variant=prompt_variant),
+        lambda notes: extract_features_multi(notes, use_cache=use_cache, prompt_variant=prompt_variant),
+        concurrency=concurrency,
+        notes_per_prompt=notes_per_prompt,
+        checkpoint_path=checkpoint_path,
+    )
@@ -0,0 +1,131 @@
+"""Bulk import of historical doctor notes.
+
+Reads a CSV or JSONL export with doctor_id, patient_id, date and text (or doctor_note) per
+note, extracts diagnosis and features in parallel under the shared Groq rate limit and stores
+each note through save_note, exactly like a note submitted in the app. Rows are validated before
+any call is made; a row that is invalid or fails is reported and the import carries on. Progress
+is checkpointed per note, so an interrupted import picks up where it stopped; failed notes are
+left out of the checkpoint and retried on the next run.
+
+    python -m models.ingest notebooks/test_data/doctor_notes_series.csv --concurrency 8
+"""
+import argparse
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from models.batch import extract_batch
+from models.extraction import extract_diagnosis_and_features
+from models.storage import save_note
+
+
+REQUIRED_FIELDS = ["doctor_id", "patient_id", "date", "text"]
+# Accepted besides ISO 8601 (e.g. "2024-10-15T09:30:00")
+DATE_FORMATS = ["%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y", "%Y/%m/%d"]
+
+
+def read_rows(path, text_column=None):
+    """Yield {doctor_id, patient_id, date, text} dicts from a CSV or JSONL file (missing fields are None)"""
+    def normalise(row):
+        text = row.get(text_column) if text_column else row.get("text", row.get("doctor_note"))
+        fields = {name: row.get(name) for name in ("doctor_id", "patient_id", "date")}
+        return dict({name: None if value is None else str(value).strip() for name, value in fields.items()}, text=text)
+
+    with open(path, "r", newline="") as file:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in file:
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        row = {}  # reported as a row with missing fields
+                    yield normalise(row if isinstance(row, dict) else {})
+        else:
+            for row in csv.DictReader(file):
+                yield normalise(row)
+
+
+def parse_date(value):
+    """ISO string of a row's date; raises ValueError for dates in none of the accepted formats"""
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date {value!r}")
+
+
+def validate_row(row):
+    """The row with its date in ISO format; raises ValueError if it cannot be stored as a note"""
+    missing = [name for name in REQUIRED_FIELDS if not row.get(name)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    # Note file names (and everything that parses them) only allow numeric ids
+    for name in ("doctor_id", "patient_id"):
+        if not row[name].isdigit():
+            raise ValueError(f"{name} {row[name]!r} is not numeric")
+    return dict(row, date=parse_date(row["date"]))
+
+
+def ingest_row(row, mode=None, executor=None):
+    """Extract and store one row; returns {"file": path}, or an error result without storing anything"""
+    try:
+        # Checked before extraction, so a bad row costs no API calls
+        row = validate_row(row)
+    except ValueError as e:
+        return {"error": f"invalid row: {e}"}
+    try:
+        diagnosis, features = extract_diagnosis_and_features(row["text"], mode=mode, executor=executor)
+        for name, document in (("diagnosis", diagnosis), ("features", features)):
+            if not isinstance(document, dict) or "error" in document:
+                return {"error": f"{name} extraction failed", "result": document}
+        file_path, _ = save_note(row["doctor_id"], row["patient_id"], row["date"], row["text"], diagnosis, features, keep_time=True)
+    except Exception as e:
+        # One failing row must not end the import
+        return {"error": f"{type(e).__name__}: {e}"}
+    return {"file": file_path}
+
+
+def ingest(path, checkpoint_path=None, concurrency=4, mode=None, text_column=None, report_every=100):
+    """Import every row of `path`; returns (stored, failed) counts"""
+    checkpoint_path = checkpoint_path or f"{path}.ingest_checkpoint.jsonl"
+    # Rows travel as JSON strings, so the checkpoint key covers the whole row and not just the text
+    rows = (json.dumps(row, sort_keys=True) for row in read_rows(path, text_column))
+    stored = failed = 0
+    start = time.perf_counter()
+    # Each note in flight runs its diagnosis and features calls side by side; the shared
+    # extraction pool is sized for the app and would cap the import at two notes at a time
+    with ThreadPoolExecutor(max_workers=2 * concurrency, thread_name_prefix="ingest-extraction") as executor:
+        results = extract_batch(
+            rows,
+            lambda row: ingest_row(json.loads(row), mode, executor),
+            concurrency=concurrency,
+            checkpoint_path=checkpoint_path,
+        )
+        for count, result in enumerate(results, 1):
+            if "error" in result:
+                failed += 1
+                print(f"Row {count}: {result['error']}")
+            else:
+                stored += 1
+            if count % report_every == 0:
+                print(f"{count} rows, {count / (time.perf_counter() - start):.1f} rows/s, {failed} failed")
+    return stored, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import of doctor notes from CSV or JSONL")
+    parser.add_argument("path", help="CSV or JSONL file with doctor_id, patient_id, date and text (or doctor_note)")
+    parser.add_argument("--checkpoint", help="progress file (default: <path>.ingest_checkpoint.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mode", choices=["parallel", "combined"], help="extraction mode (default: EXTRACTION_MODE)")
+    parser.add_argument("--text-column", help="column holding the note text")
+    args = parser.parse_args()
+
+    stored, failed = ingest(args.path, args.checkpoint, args.concurrency, args.mode, args.text_column)
+    print(f"Stored {stored} notes (including ones from earlier runs), {failed} failed; rerun to retry failures")
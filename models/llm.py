@@ -0,0 +1,282 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import httpx
+from groq import AsyncGroq, Groq
+from models.cache import CACHE_DISABLED, completion_cache, completion_key
+
+
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")  # required; only read from the environment
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL")  # None means the default Groq endpoint
+DEFAULT_MODEL = "llama-3.1-70b-versatile"
+
+# Provider limits, shared by every call made from this process
+REQUESTS_PER_MINUTE = int(os.environ.get("GROQ_REQUESTS_PER_MINUTE", "30"))
+TOKENS_PER_MINUTE = int(os.environ.get("GROQ_TOKENS_PER_MINUTE", "30000"))
+
+# Connection pool sizing for the long-lived HTTP clients
+MAX_CONNECTIONS = int(os.environ.get("GROQ_MAX_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = 60.0
+REQUEST_TIMEOUT = 60.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount):
+        """Take `amount` tokens and return how long the caller has to wait before using them"""
+        # A single request larger than the bucket would otherwise never fit
+        amount = min(amount, self.capacity)
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def adjust(self, amount):
+        """Give back (positive) or take (negative) tokens once the real cost is known"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+request_bucket = TokenBucket(REQUESTS_PER_MINUTE)
+token_bucket = TokenBucket(TOKENS_PER_MINUTE)
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def _http_limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _api_key():
+    if not GROQ_API_KEY:
+        raise RuntimeError("GROQ_API_KEY is not set; export it before making LLM calls")
+    return GROQ_API_KEY
+
+
+def get_client():
+    """Return the process-wide Groq client backed by a pooled keep-alive HTTP client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Groq(
+                    api_key=_api_key(),
+                    base_url=GROQ_BASE_URL,
+                    http_client=httpx.Client(limits=_http_limits(), timeout=REQUEST_TIMEOUT),
+                )
+    return _client
+
+
+def get_async_client():
+    """Return the process-wide AsyncGroq client backed by a pooled keep-alive HTTP client"""
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncGroq(
+                    api_key=_api_key(),
+                    base_url=GROQ_BASE_URL,
+                    http_client=httpx.AsyncClient(limits=_http_limits(), timeout=REQUEST_TIMEOUT),
+                )
+    return _async_client
+
+
+def _to_messages(prompt):
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return prompt
+
+
+def _estimate_tokens(messages, params):
+    # Rough upfront estimate (~4 characters per token) plus room for the completion;
+    # corrected against the usage reported by the API once the call returns
+    prompt_chars = sum(len(message["content"]) for message in messages)
+    return prompt_chars // 4 + params.get("max_tokens", 1024)
+
+
+def _reserve(messages, params):
+    estimated_tokens = _estimate_tokens(messages, params)
+    wait = max(request_bucket.reserve(1), token_bucket.reserve(estimated_tokens))
+    return estimated_tokens, wait
+
+
+# Token accounting per call site, from the usage fields returned by the API
+USAGE_FIELDS = ["prompt_tokens", "completion_tokens", "total_tokens"]
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def record_usage(call_site, usage=None, elapsed=0.0, cached=False):
+    with _usage_lock:
+        stats = _usage.setdefault(call_site, {"calls": 0, "cache_hits": 0, "latency_seconds": 0.0, **{field: 0 for field in USAGE_FIELDS}})
+        if cached:
+            stats["cache_hits"] += 1
+            return
+        stats["calls"] += 1
+        stats["latency_seconds"] += elapsed
+        if usage is not None:
+            for field in USAGE_FIELDS:
+                stats[field] += getattr(usage, field, None) or 0
+
+
+def get_usage_report():
+    """Aggregated usage per call site, with per-call averages"""
+    with _usage_lock:
+        report = {}
+        for call_site, stats in _usage.items():
+            report[call_site] = dict(stats)
+            calls = stats["calls"]
+            report[call_site]["avg_prompt_tokens"] = stats["prompt_tokens"] / calls if calls else 0.0
+            report[call_site]["avg_latency_seconds"] = stats["latency_seconds"] / calls if calls else 0.0
+        return report
+
+
+def reset_usage():
+    with _usage_lock:
+        _usage.clear()
+
+
+def _settle(usage, estimated_tokens, call_site, elapsed):
+    if usage is not None and usage.total_tokens is not None:
+        token_bucket.adjust(estimated_tokens - usage.total_tokens)
+    record_usage(call_site, usage, elapsed)
+
+
+def validate_json(content):
+    """`validate` for completions that must parse as JSON"""
+    json.loads(content.strip())
+
+
+def _is_valid(content, validate):
+    if validate is None:
+        return True
+    try:
+        validate(content)
+    except Exception:
+        return False
+    return True
+
+
+def _cache_lookup(messages, model, params, use_cache, refresh_cache, validate):
+    if not use_cache or CACHE_DISABLED:
+        return None, None
+    key = completion_key(model, messages, params)
+    if refresh_cache:
+        return key, None
+    cached = completion_cache.get(key)
+    # Entries stored before validation existed may hold output the caller rejects
+    if cached is not None and not _is_valid(cached, validate):
+        return key, None
+    return key, cached
+
+
+def _cache_store(key, model, content, validate):
+    if key is not None and _is_valid(content, validate):
+        completion_cache.put(key, model, content)
+
+
+def chat_completion(prompt, model=DEFAULT_MODEL, use_cache=True, refresh_cache=False, call_site="other", validate=None, **params):
+    """Send a chat completion through the shared client and rate limiter, return the message content
+
+    Identical requests are served from the completion cache. `use_cache=False` bypasses it
+    entirely, `refresh_cache=True` skips the lookup but stores the fresh result. If given,
+    `validate(content)` must not raise for a completion to be stored or served from the
+    cache, so output the caller rejects is never replayed. Token usage is aggregated under
+    `call_site`.
+    """
+    messages = _to_messages(prompt)
+    key, cached = _cache_lookup(messages, model, params, use_cache, refresh_cache, validate)
+    if cached is not None:
+        record_usage(call_site, cached=True)
+        return cached
+
+    estimated_tokens, wait = _reserve(messages, params)
+    if wait > 0:
+        time.sleep(wait)
+
+    start = time.perf_counter()
+    response = get_client().chat.completions.create(messages=messages, model=model, **params)
+    _settle(getattr(response, "usage", None), estimated_tokens, call_site, time.perf_counter() - start)
+    content = response.choices[0].message.content
+    _cache_store(key, model, content, validate)
+    return content
+
+
+async def async_chat_completion(prompt, model=DEFAULT_MODEL, use_cache=True, refresh_cache=False, call_site="other", validate=None, **params):
+    """Async variant of `chat_completion` sharing the same rate limiter and cache"""
+    messages = _to_messages(prompt)
+    key, cached = _cache_lookup(messages, model, params, use_cache, refresh_cache, validate)
+    if cached is not None:
+        record_usage(call_site, cached=True)
+        return cached
+
+    estimated_tokens, wait = _reserve(messages, params)
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+    start = time.perf_counter()
+    response = await get_async_client().chat.completions.create(messages=messages, model=model, **params)
+    _settle(getattr(response, "usage", None), estimated_tokens, call_site, time.perf_counter() - start)
+    content = response.choices[0].message.content
+    _cache_store(key, model, content, validate)
+    return content
+
+
+def stream_chat_completion(prompt, model=DEFAULT_MODEL, use_cache=True, refresh_cache=False, call_site="other", validate=None, **params):
+    """Streaming variant of `chat_completion`, yielding content deltas as they arrive
+
+    Shares the cache key of the non-streaming call, so both paths store and serve the same completion.
+    """
+    messages = _to_messages(prompt)
+    key, cached = _cache_lookup(messages, model, params, use_cache, refresh_cache, validate)
+    if cached is not None:
+        record_usage(call_site, cached=True)
+        yield cached
+        return
+
+    estimated_tokens, wait = _reserve(messages, params)
+    if wait > 0:
+        time.sleep(wait)
+
+    content = []
+    usage = None
+    start = time.perf_counter()
+    stream = get_client().chat.completions.create(messages=messages, model=model, stream=True, **params)
+    for chunk in stream:
+        # Groq reports usage on the final chunk
+        x_groq = getattr(chunk, "x_groq", None)
+        if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+            usage = x_groq.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            content.append(delta)
+            yield delta
+
+    _settle(usage, estimated_tokens, call_site, time.perf_counter() - start)
+    _cache_store(key, model, "".join(content), validate)
@@ -0,0 +1,196 @@
+"""Local (lexical) clustering of symptom names onto canonical symptoms, before the LLM is asked.
+
+Scores at or above LOCAL_MATCH_ACCEPT are merged locally. A symptom that shares nothing with
+any canonical symptom (no word, little spelling, no known location in common) starts a new
+canonical locally, and so does the same symptom on the opposite side of the body. Only names
+in between (related to some canonical, but not confidently) go to the LLM. The trade-off: a
+synonym sharing neither spelling nor location with its canonical ("fatigue" / "tiredness"
+without locations) is not recognised and becomes a canonical of its own.
+
+Names of one note are assigned best match first (ties by name), so when two of them compete
+for a canonical, e.g. left and right knee pain for "knee pain", the outcome does not depend on
+the order the note lists them in; the loser, if it is on the opposite side, starts its own.
+"""
+import math
+import re
+from collections import Counter
+
+
+LOCAL_MATCH_ACCEPT = 0.72
+# Character trigram similarity from which two names count as related (and go to the LLM)
+LOCAL_MATCH_RELATED = 0.25
+
+# Words that describe how a symptom presents rather than which symptom it is
+STOPWORDS = {
+    "a", "an", "and", "at", "due", "for", "from", "in", "of", "on", "the", "to", "with",
+    "intermittent", "constant", "episodic", "occasional", "mild", "moderate", "severe",
+    "chronic", "acute", "persistent", "worsening", "recurrent",
+}
+LATERALITY = {"left", "right", "bilateral"}
+
+
+def tokenize(text):
+    if not text or text == "-1":
+        return set()
+    return {token for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS}
+
+
+def without_sides(text):
+    return " ".join(token for token in re.findall(r"[a-z0-9]+", (text or "").lower()) if token not in LATERALITY)
+
+
+def char_ngrams(text, n=3):
+    text = f" {' '.join(sorted(tokenize(text)))} "
+    return Counter(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+class SymptomMatcher:
+    """Lexical symptom similarity over the names of one mapping run.
+
+    Combines an IDF-weighted token-set overlap, a character trigram TF-IDF cosine and
+    agreement of the symptoms' `location` fields. IDF weights come from the names being
+    matched, so words shared by most symptoms ("right", "leg") count for little.
+    """
+
+    def __init__(self, names):
+        names = list(names)
+        token_df = Counter(token for name in names for token in tokenize(name))
+        ngram_df = Counter(ngram for name in names for ngram in char_ngrams(name))
+        total = len(names) + 1
+        self.token_idf = {token: math.log(total / count) + 1 for token, count in token_df.items()}
+        self.ngram_idf = {ngram: math.log(total / count) + 1 for ngram, count in ngram_df.items()}
+        self._vectors = {}
+
+    def _vector(self, name):
+        if name not in self._vectors:
+            vector = {ngram: count * self.ngram_idf.get(ngram, 1.0) for ngram, count in char_ngrams(name).items()}
+            norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+            self._vectors[name] = {ngram: value / norm for ngram, value in vector.items()}
+        return self._vectors[name]
+
+    def token_similarity(self, a, b):
+        tokens_a, tokens_b = tokenize(a), tokenize(b)
+        if not tokens_a or not tokens_b:
+            return 0.0
+        weight = lambda tokens: sum(self.token_idf.get(token, 1.0) for token in tokens)
+        shared = weight(tokens_a & tokens_b)
+        # Average of weighted Jaccard and weighted containment, so "lumbar pain" and
+        # "lower lumbar pain" still score high
+        jaccard = shared / weight(tokens_a | tokens_b)
+        containment = shared / min(weight(tokens_a), weight(tokens_b))
+        return (jaccard + containment) / 2
+
+    def ngram_similarity(self, a, b):
+        vector_a, vector_b = self._vector(a), self._vector(b)
+        return sum(value * vector_b.get(ngram, 0.0) for ngram, value in vector_a.items())
+
+    @staticmethod
+    def location_agreement(location_a, location_b):
+        tokens_a, tokens_b = tokenize(location_a), tokenize(location_b)
+        if not tokens_a or not tokens_b:
+            return 0.5  # unknown location neither helps nor hurts
+        return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+    @staticmethod
+    def opposite_sides(a, b, location_a="", location_b=""):
+        sides_a = (tokenize(a) | tokenize(location_a)) & LATERALITY
+        sides_b = (tokenize(b) | tokenize(location_b)) & LATERALITY
+        return bool(sides_a and sides_b and sides_a != sides_b)
+
+    def related(self, a, b, location_a="", location_b=""):
+        """Whether two symptoms have anything in common: a word, part of the spelling or a location"""
+        return bool(
+            tokenize(a) & tokenize(b)
+            or tokenize(without_sides(location_a)) & tokenize(without_sides(location_b))
+            or self.ngram_similarity(a, b) >= LOCAL_MATCH_RELATED
+        )
+
+    def score(self, a, b, location_a="", location_b=""):
+        # Opposite sides of the body are never the same symptom
+        if self.opposite_sides(a, b, location_a, location_b):
+            return 0.0
+        return self.lexical_score(a, b, location_a, location_b)
+
+    def lexical_score(self, a, b, location_a="", location_b=""):
+        if a.strip().lower() == b.strip().lower():
+            return 1.0
+        return (
+            0.5 * self.token_similarity(a, b)
+            + 0.3 * self.ngram_similarity(a, b)
+            + 0.2 * self.location_agreement(location_a, location_b)
+        )
+
+
+def match_symptoms_locally(canonical_symptoms, new_symptoms, accept=LOCAL_MATCH_ACCEPT):
+    """Cluster new symptoms onto canonical ones where the lexical match is unambiguous.
+
+    See the module docstring for when a symptom is merged, starts a new canonical or is left
+    for the LLM. Notes are processed in the order given.
+
+    `canonical_symptoms` maps canonical name -> {note_file: (name, location)} and
+    `new_symptoms` maps note_file -> {name: location}. Returns the confident mapping in the
+    usual `{"symptoms": {canonical: {note_file: name}}}` form and the ambiguous remainder as
+    `{note_file: [names]}`.
+    """
+    clusters = {canonical: dict(members) for canonical, members in canonical_symptoms.items()}
+    names = list(clusters) + [name for members in clusters.values() for name, _ in members.values()]
+    names += [name for symptoms in new_symptoms.values() for name in symptoms]
+    matcher = SymptomMatcher(names)
+
+    mapping = {}
+    ambiguous = {}
+
+    def assign(canonical, note_file, name, location):
+        clusters.setdefault(canonical, {})[note_file] = (name, location)
+        mapping.setdefault(canonical, {})[note_file] = name
+
+    for note_file, symptoms in new_symptoms.items():
+        matches = []  # (score, name, canonical) at or above `accept`
+        # Best score, ignoring the side, among candidates on the opposite side of the body
+        best_opposite_score = {}
+        related = {}
+        for name, location in symptoms.items():
+            best_opposite_score[name] = 0.0
+            related[name] = False
+            for canonical, members in clusters.items():
+                best_score = 0.0
+                # The canonical name carries no location: scoring pairs it with the new symptom's, relatedness with none
+                related[name] = related[name] or any(
+                    matcher.related(name, other, location, other_location) for other, other_location in [(canonical, "")] + list(members.values())
+                )
+                for other, other_location in [(canonical, location)] + list(members.values()):
+                    if matcher.opposite_sides(name, other, location, other_location):
+                        best_opposite_score[name] = max(best_opposite_score[name], matcher.lexical_score(
+                            without_sides(name), without_sides(other), without_sides(location), without_sides(other_location)
+                        ))
+                        continue
+                    best_score = max(best_score, matcher.lexical_score(name, other, location, other_location))
+                if best_score >= accept:
+                    matches.append((best_score, name, canonical))
+
+        # Best pairs first; a canonical symptom holds one name per note
+        taken = {}
+        for _, name, canonical in sorted(matches, key=lambda match: (-match[0], match[1], match[2])):
+            if note_file not in clusters[canonical] and canonical not in taken and name not in taken.values():
+                taken[canonical] = name
+        for canonical, name in taken.items():
+            assign(canonical, note_file, name, symptoms[name])
+
+        for name in sorted(set(symptoms) - set(taken.values())):
+            location = symptoms[name]
+            # The same symptom on the other side of the body as a name of this note that was just matched
+            lost_to_other_side = any(
+                matcher.opposite_sides(name, other, location, symptoms[other]) and matcher.lexical_score(
+                    without_sides(name), without_sides(other), without_sides(location), without_sides(symptoms[other])
+                ) >= accept
+                for other in taken.values()
+            )
+            if best_opposite_score[name] >= accept or lost_to_other_side or not related[name]:
+                canonical = name
+                while canonical in clusters:
+                    canonical += " (2)"
+                assign(canonical, note_file, name, location)
+            else:
+                ambiguous.setdefault(note_file, []).append(name)
+
+    return {"symptoms": mapping}, ambiguous
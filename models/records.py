@@ -0,0 +1,189 @@
+"""Typed note records, parsed once when a note is read.
+
+On disk every value is a string (intensity "5" or "-1", is_active "True"); the records hold
+intensity as an int (None if not mentioned) and is_active as a bool. encode_note produces the
+on-disk document again, field for field, so records can be read and written without loss.
+loads_note/dumps_note use orjson when it is installed.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+SYMPTOM_FIELDS = ("description", "location", "duration", "frequency", "intensity", "is_active", "raw_data")
+
+
+def parse_intensity(value):
+    """'5' -> 5, '-1' / '' -> None; raises ValueError for anything else"""
+    if value is None or value == "" or value == "-1" or value == -1:
+        return None
+    return int(value)
+
+
+def parse_is_active(value):
+    if isinstance(value, bool):
+        return value
+    lowered = str(value).strip().lower()
+    if lowered in ("true", "false"):
+        return lowered == "true"
+    raise ValueError(f"not a boolean: {value!r}")
+
+
+class Symptom:
+    __slots__ = ("name", "description", "location", "duration", "frequency", "intensity", "is_active", "raw_data", "_keys", "_raw")
+
+    def __init__(self, name, description="", location="", duration=None, frequency=None, intensity=None, is_active=True, raw_data=""):
+        self.name = name
+        self.description = description
+        self.location = location
+        self.duration = duration
+        self.frequency = frequency
+        self.intensity = intensity
+        self.is_active = is_active
+        self.raw_data = raw_data
+        # Field order and values that did not parse, so encoding reproduces the document
+        self._keys = None
+        self._raw = None
+
+    @classmethod
+    def from_dict(cls, name, data):
+        symptom = cls(name)
+        raw = {}
+        for key, value in data.items():
+            if key == "intensity":
+                try:
+                    symptom.intensity = parse_intensity(value)
+                except (TypeError, ValueError):
+                    raw[key] = value
+            elif key == "is_active":
+                try:
+                    symptom.is_active = parse_is_active(value)
+                except ValueError:
+                    raw[key] = value
+            elif key in SYMPTOM_FIELDS:
+                setattr(symptom, key, value)
+            else:
+                raw[key] = value
+        symptom._keys = tuple(data)
+        symptom._raw = raw or None
+        return symptom
+
+    def to_dict(self):
+        keys = self._keys or ("description", "location", "intensity", "is_active", "raw_data")
+        raw = self._raw or {}
+        document = {}
+        for key in keys:
+            if key in raw:
+                document[key] = raw[key]
+            elif key == "intensity":
+                document[key] = "-1" if self.intensity is None else str(self.intensity)
+            elif key == "is_active":
+                document[key] = str(self.is_active)
+            else:
+                document[key] = getattr(self, key)
+        return document
+
+    def __repr__(self):
+        return f"Symptom({self.name!r}, location={self.location!r}, intensity={self.intensity!r}, is_active={self.is_active!r})"
+
+
+class Diagnosis:
+    __slots__ = ("diagnosis", "reasoning", "_raw")
+
+    def __init__(self, diagnosis="", reasoning="", raw=None):
+        self.diagnosis = diagnosis
+        self.reasoning = reasoning
+        # The full document when it is not a plain diagnosis (e.g. an extraction error)
+        self._raw = raw
+
+    @classmethod
+    def from_dict(cls, data):
+        if not isinstance(data, dict):
+            return cls("", "", data)
+        return cls(data.get("diagnosis", ""), data.get("reasoning", ""), None if list(data) == ["diagnosis", "reasoning"] else data)
+
+    def to_dict(self):
+        if self._raw is None:
+            return {"diagnosis": self.diagnosis, "reasoning": self.reasoning}
+        if not isinstance(self._raw, dict):
+            return self._raw
+        document = dict(self._raw)
+        for key in ("diagnosis", "reasoning"):
+            if key in document:
+                document[key] = getattr(self, key)
+        return document
+
+
+class Note:
+    __slots__ = ("file_name", "doctor_id", "patient_id", "date", "doctor_note", "diagnosis", "symptoms", "_features", "_extra")
+
+    def __init__(self, file_name, doctor_id, patient_id, date, doctor_note, diagnosis, symptoms):
+        self.file_name = file_name
+        self.doctor_id = doctor_id
+        self.patient_id = patient_id
+        self.date = date  # ISO string, as stored
+        self.doctor_note = doctor_note
+        self.diagnosis = diagnosis
+        self.symptoms = symptoms  # name -> Symptom, in note order
+        self._features = None  # features document when it is not a symptom mapping (e.g. an extraction error)
+        self._extra = None
+
+    def to_dict(self):
+        return encode_note(self)
+
+
+def decode_note(data, file_name=None):
+    """Note record of an on-disk note document"""
+    features = data.get("features")
+    symptoms_data = features.get("symptoms") if isinstance(features, dict) else None
+    symptoms = {}
+    if isinstance(symptoms_data, dict):
+        symptoms = {name: Symptom.from_dict(name, symptom) for name, symptom in symptoms_data.items()}
+    note = Note(
+        file_name,
+        data.get("doctor_id"),
+        data.get("patient_id"),
+        data.get("date"),
+        data.get("doctor_note"),
+        Diagnosis.from_dict(data.get("diagnosis", {})),
+        symptoms,
+    )
+    if not isinstance(symptoms_data, dict) or list(features) != ["symptoms"]:
+        note._features = features
+    extra = {key: value for key, value in data.items() if key not in ("doctor_id", "patient_id", "date", "doctor_note", "diagnosis", "features")}
+    note._extra = extra or None
+    return note
+
+
+def encode_note(note):
+    """On-disk document of a Note record"""
+    if note._features is not None:
+        features = note._features
+    else:
+        features = {"symptoms": {name: symptom.to_dict() for name, symptom in note.symptoms.items()}}
+    document = {
+        "doctor_id": note.doctor_id,
+        "patient_id": note.patient_id,
+        "date": note.date,
+        "doctor_note": note.doctor_note,
+        "diagnosis": note.diagnosis.to_dict(),
+        "features": features,
+    }
+    if note._extra:
+        document.update(note._extra)
+    return document
+
+
+def loads_note(text, file_name=None):
+    """Note record of a serialized note"""
+    return decode_note(orjson.loads(text) if orjson is not None else json.loads(text), file_name)
+
+
+def dumps_note(note):
+    """Serialized note, pretty-printed like the files in data/doctor_notes/"""
+    if orjson is not None:
+        return orjson.dumps(encode_note(note), option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(encode_note(note), indent=2)
@@ -1,12 +1,13 @@
 import pandas as pd
 import plotly.graph_objects as go
 from typing import List, Dict, Any
-from groq import Groq
 import pdfkit
 import markdown2
 import tempfile
 import os
 from datetime import datetime
+from models.analytics import downsample_timeline, figure_cache, frame_fingerprint, scatter_trace
+from models.llm import chat_completion
 
 
 def preprocess_data(data: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -33,16 +34,26 @@ def preprocess_data(data: List[Dict[str, Any]]) -> Dict[str, Any]:
         "temporal_markers": [],
     }
 
-    # Process each symptom
-    for symptom in processed_data["symptoms"]:
-        symptom_data = df[df["symptom"] == symptom]
-
-        # Calculate key metrics
-        max_intensity = symptom_data["intensity"].max()
-        avg_intensity = symptom_data["intensity"].mean()
-        active_days = int(symptom_data["is_active"].astype(bool).sum())
-        total_days = len(symptom_data)
-
+    # Key metrics of every symptom in one grouped aggregation
+    metrics = (
+        df.assign(is_active=df["is_active"].astype(bool))
+        .groupby("symptom", sort=False)
+        .agg(
+            max_intensity=("intensity", "max"),
+            avg_intensity=("intensity", "mean"),
+            active_days=("is_active", "sum"),
+            total_days=("intensity", "size"),
+        )
+        .reindex(processed_data["symptoms"])
+    )
+    for symptom, max_intensity, avg_intensity, active_days, total_days in zip(
+        processed_data["symptoms"],
+        metrics["max_intensity"],
+        metrics["avg_intensity"],
+        metrics["active_days"].fillna(0).astype(int),
+        metrics["total_days"].fillna(0).astype(int),
+    ):
+        active_days, total_days = int(active_days), int(total_days)
         processed_data["measurements"].append(
             {
                 "symptom": symptom,
@@ -54,28 +65,33 @@ def preprocess_data(data: List[Dict[str, Any]]) -> Dict[str, Any]:
             }
         )
 
-        # Find significant changes
-        intensity_changes = symptom_data["intensity"].diff()
-        significant_changes = symptom_data[abs(intensity_changes) > 0.3]
-
-        for _, change in significant_changes.iterrows():
-            processed_data["temporal_markers"].append(
-                {
-                    "date": change["date"].strftime("%Y-%m-%d"),
-                    "symptom": symptom,
-                    "change": change["intensity"]
-                    - (change["intensity"] - intensity_changes[change.name]),
-                    "description": change["reason"],
-                }
-            )
+    # Find significant changes: intensity differences between consecutive rows of a symptom
+    intensity_changes = df.groupby("symptom", sort=False)["intensity"].diff()
+    significant = abs(intensity_changes) > 0.3
+    changes = df[significant].assign(
+        change=df["intensity"][significant] - (df["intensity"][significant] - intensity_changes[significant]),
+        symptom_order=df["symptom"][significant].map({symptom: i for i, symptom in enumerate(processed_data["symptoms"])}),
+    ).sort_values("symptom_order", kind="stable")
+    processed_data["temporal_markers"] = [
+        {
+            "date": date,
+            "symptom": symptom,
+            "change": change,
+            "description": description,
+        }
+        for date, symptom, change, description in zip(
+            changes["date"].dt.strftime("%Y-%m-%d").tolist(),
+            changes["symptom"].tolist(),
+            changes["change"].tolist(),
+            changes["reason"].tolist(),
+        )
+    ]
 
     return processed_data
 
 
-def generate_llm_insights(processed_data: Dict[str, Any]) -> Dict[str, str]:
+def generate_llm_insights(processed_data: Dict[str, Any], use_cache: bool = True) -> Dict[str, str]:
     """Generate insights using LLM"""
-    client = Groq(api_key="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")
-
     # Context Layer
     context = f"""You are a medical professional analyzing patient symptom data over the period {processed_data['time_period']}.
     The key symptoms being tracked are: {', '.join(processed_data['symptoms'])}.
@@ -119,24 +135,22 @@ Please provide:
 Use medical terminology but explain key terms."""
 
     # Generate insights
-    analysis_response = client.chat.completions.create(
-        messages=[{"role": "user", "content": analysis_prompt}],
-        model="llama-3.1-70b-versatile",
-    )
-
-    summary_response = client.chat.completions.create(
-        messages=[{"role": "user", "content": summary_prompt}],
-        model="llama-3.1-70b-versatile",
-    )
+    analysis = chat_completion(analysis_prompt, use_cache=use_cache, call_site="report_analysis")
+    summary = chat_completion(summary_prompt, use_cache=use_cache, call_site="report_summary")
 
     return {
-        "analysis": analysis_response.choices[0].message.content,
-        "summary": summary_response.choices[0].message.content,
+        "analysis": analysis,
+        "summary": summary,
     }
 
 
-def create_symptom_timeline(df: pd.DataFrame) -> go.Figure:
+def create_symptom_timeline(df: pd.DataFrame, use_cache: bool = True) -> go.Figure:
     """Create a timeline visualization of symptoms"""
+    if use_cache:
+        return figure_cache.get_or_build("report_timeline", frame_fingerprint(df), lambda: create_symptom_timeline(df, use_cache=False))
+
+    df = downsample_timeline(df)
+    trace = scatter_trace(len(df))
     fig = go.Figure()
 
     # Get unique symptoms
@@ -151,7 +165,7 @@ def create_symptom_timeline(df: pd.DataFrame) -> go.Figure:
 
         # Add intensity line
         fig.add_trace(
-            go.Scatter(
+            trace(
                 x=symptom_data["date"],
                 y=symptom_data["intensity"],
                 name=f"{symptom} (intensity)",
@@ -0,0 +1,645 @@
+"""Note storage backends. Every read and write of a doctor note goes through a NoteStore.
+
+NOTE_STORE=filesystem (default) keeps one JSON file per note; NOTE_STORE=sqlite keeps notes,
+diagnoses and symptoms as normalized rows in an embedded database.
+
+    python -m models.storage migrate     # copy data/doctor_notes/*.json into the SQLite store
+    python -m models.storage reshard     # move notes into the NOTE_LAYOUT directory layout
+"""
+import abc
+import argparse
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from models.cache import ParsedNoteCache
+from models.records import decode_note, dumps_note, encode_note, loads_note
+from models.catalog import DOCTOR_NOTES_DIR, get_note_catalog, parse_note_filename
+from models.symptom_table import append_note as append_to_symptom_table
+
+
+NOTE_STORE = os.environ.get("NOTE_STORE", "filesystem")
+NOTE_DB_PATH = os.environ.get("NOTE_DB_PATH", 'data/notes.sqlite')
+NOTE_FIELDS = ["doctor_id", "patient_id", "date", "doctor_note", "diagnosis", "features"]
+# flat: data/doctor_notes/<note>; sharded: data/doctor_notes/<doctor_id>/<patient_id>/<yyyy>/<mm>/<note>.
+# Notes are found in either layout, so a tree can be resharded while the app runs.
+NOTE_LAYOUT = os.environ.get("NOTE_LAYOUT", "flat")
+# journal: edits are appended to a sidecar '<note>.journal.jsonl' and folded in on read; rewrite: every edit rewrites the note
+NOTE_EDIT_MODE = os.environ.get("NOTE_EDIT_MODE", "journal")
+JOURNAL_COMPACT_AFTER = int(os.environ.get("NOTE_JOURNAL_COMPACT_AFTER", "20"))  # edits
+
+try:
+    import fcntl
+except ImportError:  # Windows: journal appends are not locked across processes
+    fcntl = None
+
+# Journals are folded into their note off the request path
+compaction_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="note-compaction")
+
+
+class CustomJSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, (datetime, date)):
+            return obj.isoformat()
+        return super().default(obj)
+
+
+def note_file_name(note):
+    # Notes are identified by their file name; full paths are accepted everywhere
+    return os.path.basename(note)
+
+
+def symptom_edits(original_name, name, location, intensity, is_active):
+    """Edit records for the symptom editor: a renamed symptom is replaced by the edited fields"""
+    if original_name == name:
+        return [
+            {"op": "set", "symptom": name, "field": "location", "value": str(location)},
+            {"op": "set", "symptom": name, "field": "intensity", "value": str(intensity)},
+            {"op": "set", "symptom": name, "field": "is_active", "value": str(is_active).capitalize()},
+        ]
+    return [
+        {"op": "rename", "symptom": original_name, "field": None, "value": name},
+        {"op": "replace", "symptom": name, "field": None, "value": {
+            'location': str(location),
+            'intensity': str(intensity),
+            'is_active': str(is_active).capitalize()
+        }},
+    ]
+
+
+def diagnosis_edits(diagnosis):
+    return [{"op": "set", "symptom": None, "field": "diagnosis", "value": diagnosis}]
+
+
+def apply_edit(data, edit):
+    """Apply one edit record to a note document (in place); raises KeyError if its target does not exist"""
+    if edit["op"] == "set" and edit["symptom"] is None:
+        data['diagnosis'][edit["field"]] = edit["value"]
+    elif edit["op"] == "set":
+        data['features']['symptoms'][edit["symptom"]][edit["field"]] = edit["value"]
+    elif edit["op"] == "rename":
+        symptoms = data['features']['symptoms']
+        symptoms[edit["value"]] = symptoms.pop(edit["symptom"])
+    elif edit["op"] == "replace":
+        data['features']['symptoms'][edit["symptom"]] = edit["value"]
+    else:
+        raise ValueError(f"Unknown edit operation: {edit['op']}")
+
+
+class NoteStore(abc.ABC):
+    """Interface of a note storage backend; a backend must implement every abstract method"""
+
+    def note_path(self, file_name):
+        """Path under which a note is known to the rest of the app"""
+        return os.path.join(DOCTOR_NOTES_DIR, note_file_name(file_name))
+
+    @abc.abstractmethod
+    def read_note(self, note):
+        """Return the note document; raises IOError if it does not exist"""
+
+    def exists(self, note):
+        try:
+            self.read_note(note)
+        except IOError:
+            return False
+        return True
+
+    def read_notes(self, notes):
+        """Return {file_name: document} for several notes"""
+        return {note_file_name(note): self.read_note(note) for note in notes}
+
+    def read_record(self, note):
+        """The note as a typed Note record (see models.records)"""
+        return decode_note(self.read_note(note), note_file_name(note))
+
+    def read_records(self, notes):
+        """Return {file_name: Note record} for several notes"""
+        return {note_file_name(note): self.read_record(note) for note in notes}
+
+    @abc.abstractmethod
+    def write_note(self, file_name, data):
+        """Store a new note and return its path"""
+
+    @abc.abstractmethod
+    def update_note(self, note, update):
+        """Apply `update(document)` (in place) to a stored note and return the updated document"""
+
+    def apply_edits(self, note, edits):
+        """Apply edit records (see apply_edit) to a stored note and return the updated document"""
+        def update(data):
+            for edit in edits:
+                apply_edit(data, edit)
+        return self.update_note(note, update)
+
+    @abc.abstractmethod
+    def all_notes(self):
+        """Paths of every stored note, oldest first"""
+
+    @abc.abstractmethod
+    def notes_of_patient(self, doctor_id, patient_id):
+        """Paths of a patient's notes, most recent first"""
+
+    @abc.abstractmethod
+    def latest_note(self, doctor_id=None, patient_id=None):
+        """Path of the most recent note, optionally of one doctor and/or patient (None if there is none)"""
+
+    @abc.abstractmethod
+    def notes_in_range(self, doctor_id, patient_id, start_date, end_date):
+        """Paths of a patient's notes dated from `start_date` through `end_date`, oldest first"""
+
+
+class FileSystemNoteStore(NoteStore):
+    """One pretty-printed JSON file per note, indexed by the note catalog.
+
+    Notes are read and written through the record codec (models.records) and kept as typed
+    records in an (mtime, size)-validated cache, so repeated reads of an unchanged file skip the
+    disk read and the parse; the store's own writes refresh it. Documents are encoded from the
+    cached record on every read_note.
+
+    In journal mode, edits are appended under an exclusive lock to a sidecar journal and folded
+    over the note on read; once a journal grows past JOURNAL_COMPACT_AFTER edits it is folded into
+    the note in the background (atomic replace, then the journal is emptied).
+    """
+
+    def __init__(self, doctor_notes_dir=DOCTOR_NOTES_DIR, note_cache=None, edit_mode=NOTE_EDIT_MODE, layout=NOTE_LAYOUT):
+        self.doctor_notes_dir = doctor_notes_dir
+        self.note_cache = note_cache or ParsedNoteCache()
+        self.edit_mode = edit_mode
+        self.layout = layout
+
+    def layout_path(self, file_name, layout):
+        file_name = note_file_name(file_name)
+        parsed = parse_note_filename(file_name)
+        if layout != "sharded" or parsed is None:
+            return os.path.join(self.doctor_notes_dir, file_name)
+        doctor_id, patient_id, note_date = parsed
+        return os.path.join(self.doctor_notes_dir, doctor_id, patient_id, note_date[:4], note_date[5:7], file_name)
+
+    def note_path(self, file_name):
+        # Where the note is, in the configured layout or else the other one; new notes go to the configured layout
+        preferred = self.layout_path(file_name, self.layout)
+        if os.path.exists(preferred):
+            return preferred
+        other = self.layout_path(file_name, "flat" if self.layout == "sharded" else "sharded")
+        return other if os.path.exists(other) else preferred
+
+    def journal_path(self, note):
+        return f"{self.note_path(note)}.journal.jsonl"
+
+    def history_path(self, note):
+        return f"{self.note_path(note)}.history.jsonl"
+
+    def _read_journal(self, journal_file):
+        edits = []
+        for line in journal_file:
+            try:
+                edits.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A torn final line from an interrupted append
+                continue
+        return edits
+
+    def _read(self, path):
+        # The note file's text and the edits journaled since it was last rewritten
+        with open(path, 'r', encoding="utf-8") as file:
+            text = file.read()
+        try:
+            with open(f"{path}.journal.jsonl", 'r') as journal_file:
+                return text, self._read_journal(journal_file)
+        except FileNotFoundError:
+            return text, []
+
+    def _fold(self, data, edits):
+        for edit in edits:
+            try:
+                apply_edit(data, edit)
+            except (KeyError, TypeError):
+                # Edits already folded in by an interrupted compaction may no longer apply (e.g. a rename)
+                continue
+        return data
+
+    def _load(self, path):
+        text, edits = self._read(path)
+        if not edits:
+            return loads_note(text, note_file_name(path))
+        return decode_note(self._fold(json.loads(text), edits), note_file_name(path))
+
+    def _write(self, path, note):
+        # Written aside and renamed, so readers never see a partial note
+        with open(f"{path}.tmp", 'w', encoding="utf-8") as file:
+            file.write(dumps_note(note))
+        os.replace(f"{path}.tmp", path)
+
+    def read_note(self, note):
+        return encode_note(self.read_record(note))
+
+    def exists(self, note):
+        return os.path.exists(self.note_path(note))
+
+    def read_record(self, note):
+        file_path = self.note_path(note)
+        return self.note_cache.get(file_path, self._load, companions=(self.journal_path(note),))
+
+    def write_note(self, file_name, data):
+        file_path = self.note_path(file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # Dates and other non-JSON values are stored as the JSON round trip, exactly as a later read parses them
+        record = loads_note(json.dumps(data, cls=CustomJSONEncoder), note_file_name(file_path))
+        self._write(file_path, record)
+        self.note_cache.put(file_path, record)
+        get_note_catalog().add_note(file_path)
+        return file_path
+
+    def _locked_journal(self, note):
+        if not os.path.exists(self.note_path(note)):
+            raise FileNotFoundError(f"No such note: {self.note_path(note)}")
+        journal_file = open(self.journal_path(note), 'a+')
+        if fcntl is not None:
+            fcntl.flock(journal_file, fcntl.LOCK_EX)
+        return journal_file
+
+    def update_note(self, note, update):
+        """Rewrite the note with `update` applied, folding in (and emptying) its journal"""
+        file_path = self.note_path(note)
+        self.note_cache.invalidate(file_path)
+        with self._locked_journal(note) as journal_file:
+            text, edits = self._read(file_path)
+            data = self._fold(json.loads(text), edits)
+            update(data)
+            record = decode_note(data, note_file_name(file_path))
+            self._write(file_path, record)
+            if edits:
+                # Folded edits move to the note's history, which keeps the full audit trail
+                with open(self.history_path(note), 'a') as history_file:
+                    history_file.write("".join(json.dumps(edit) + "\n" for edit in edits))
+            # Only emptied once the note holds the edits; replaying them onto it is harmless
+            journal_file.truncate(0)
+            self.note_cache.put(file_path, record, companions=(self.journal_path(note),))
+        return data
+
+    def apply_edits(self, note, edits):
+        if self.edit_mode != "journal":
+            return super().apply_edits(note, edits)
+
+        file_path = self.note_path(note)
+        with self._locked_journal(note) as journal_file:
+            # Validate against the current document before anything is recorded
+            data = copy.deepcopy(self.read_note(note))
+            for edit in edits:
+                apply_edit(data, edit)
+
+            timestamp = datetime.now().isoformat()
+            journal_file.write("".join(json.dumps(dict(edit, ts=timestamp)) + "\n" for edit in edits))
+            journal_file.flush()
+            self.note_cache.put(file_path, decode_note(data, note_file_name(file_path)), companions=(self.journal_path(note),))
+            journal_file.seek(0)
+            journal_length = sum(1 for _ in journal_file)
+
+        if journal_length >= JOURNAL_COMPACT_AFTER:
+            compaction_executor.submit(self.compact, note)
+        return data
+
+    def compact(self, note):
+        """Fold a note's journal into the note file"""
+        self.update_note(note, lambda data: None)
+
+    def move_note(self, note, layout):
+        """Move a note and its journal/history files into `layout`; returns the new path"""
+        source = self.note_path(note)
+        target = self.layout_path(note, layout)
+        if os.path.normpath(source) == os.path.normpath(target):
+            return target
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Holding the journal lock keeps edits out while the files move
+        with self._locked_journal(note):
+            if os.path.exists(f"{source}.history.jsonl"):
+                os.replace(f"{source}.history.jsonl", f"{target}.history.jsonl")
+            os.replace(source, target)
+            # Locking created the journal if the note had none; an empty one is not moved along
+            if os.path.getsize(f"{source}.journal.jsonl") == 0:
+                os.remove(f"{source}.journal.jsonl")
+            else:
+                os.replace(f"{source}.journal.jsonl", f"{target}.journal.jsonl")
+        self.note_cache.invalidate(source)
+        get_note_catalog().move_note(source, target)
+        return target
+
+    def reshard(self, layout=None):
+        """Move every note into `layout` (default: the store's layout); returns the number moved"""
+        layout = layout or self.layout
+        moved = 0
+        for root, _, filenames in os.walk(self.doctor_notes_dir):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if parse_note_filename(filename) and os.path.normpath(path) != os.path.normpath(self.layout_path(filename, layout)):
+                    self.move_note(filename, layout)
+                    moved += 1
+        if layout == "sharded":
+            return moved
+        # Drop the shard directories emptied by a move back to the flat layout
+        for root, _, _ in os.walk(self.doctor_notes_dir, topdown=False):
+            if os.path.normpath(root) != os.path.normpath(self.doctor_notes_dir) and not os.listdir(root):
+                os.rmdir(root)
+        return moved
+
+    def edit_history(self, note):
+        """Every journaled edit of a note, oldest first"""
+        edits = []
+        for path in (self.history_path(note), self.journal_path(note)):
+            try:
+                with open(path, 'r') as file:
+                    edits += self._read_journal(file)
+            except FileNotFoundError:
+                pass
+        return edits
+
+    def all_notes(self):
+        return get_note_catalog().all_notes()
+
+    def notes_of_patient(self, doctor_id, patient_id):
+        return get_note_catalog().notes_of_patient(doctor_id, patient_id)
+
+    def latest_note(self, doctor_id=None, patient_id=None):
+        return get_note_catalog().latest_note(doctor_id, patient_id)
+
+    def notes_in_range(self, doctor_id, patient_id, start_date, end_date):
+        return get_note_catalog().notes_in_range(doctor_id, patient_id, start_date, end_date)
+
+
+class SQLiteNoteStore(NoteStore):
+    """Notes, diagnoses and symptoms as normalized rows in an embedded SQLite database.
+
+    Each symptom keeps its full original document next to the indexed columns, so notes
+    read back exactly as they were written.
+    """
+
+    def __init__(self, path=NOTE_DB_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS notes (
+                    file_name TEXT PRIMARY KEY,
+                    doctor_id TEXT,
+                    patient_id TEXT,
+                    date TEXT,
+                    doctor_note TEXT,
+                    features TEXT,  -- only set when the features are not a symptom mapping (e.g. an extraction error)
+                    extra TEXT,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS notes_by_patient ON notes (doctor_id, patient_id, created_at);
+                CREATE INDEX IF NOT EXISTS notes_by_date ON notes (doctor_id, patient_id, date);
+                CREATE TABLE IF NOT EXISTS diagnoses (
+                    file_name TEXT PRIMARY KEY REFERENCES notes (file_name) ON DELETE CASCADE,
+                    diagnosis TEXT,
+                    reasoning TEXT,
+                    document TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS symptoms (
+                    file_name TEXT NOT NULL REFERENCES notes (file_name) ON DELETE CASCADE,
+                    position INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    location TEXT,
+                    intensity TEXT,
+                    is_active TEXT,
+                    document TEXT NOT NULL,
+                    PRIMARY KEY (file_name, position)
+                );
+                CREATE INDEX IF NOT EXISTS symptoms_by_name ON symptoms (name);
+                """
+            )
+
+    def _write_rows(self, file_name, data, created_at):
+        extra = {key: value for key, value in data.items() if key not in NOTE_FIELDS}
+        diagnosis = data.get("diagnosis", {})
+        features = data.get("features", {})
+        symptoms = features.get("symptoms") if isinstance(features, dict) else None
+        has_symptoms = isinstance(symptoms, dict) and list(features) == ["symptoms"]
+
+        self.connection.execute("DELETE FROM symptoms WHERE file_name = ?", (file_name,))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                file_name, data.get("doctor_id"), data.get("patient_id"), data.get("date"), data.get("doctor_note"),
+                None if has_symptoms else json.dumps(features, cls=CustomJSONEncoder),
+                json.dumps(extra, cls=CustomJSONEncoder) if extra else None,
+                created_at,
+            ),
+        )
+        self.connection.execute(
+            "INSERT OR REPLACE INTO diagnoses VALUES (?, ?, ?, ?)",
+            (
+                file_name,
+                diagnosis.get("diagnosis") if isinstance(diagnosis, dict) else None,
+                diagnosis.get("reasoning") if isinstance(diagnosis, dict) else None,
+                json.dumps(diagnosis, cls=CustomJSONEncoder),
+            ),
+        )
+        if has_symptoms:
+            self.connection.executemany(
+                "INSERT INTO symptoms VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        file_name, position, name,
+                        symptom.get("location") if isinstance(symptom, dict) else None,
+                        symptom.get("intensity") if isinstance(symptom, dict) else None,
+                        symptom.get("is_active") if isinstance(symptom, dict) else None,
+                        json.dumps(symptom, cls=CustomJSONEncoder),
+                    )
+                    for position, (name, symptom) in enumerate(symptoms.items())
+                ],
+            )
+
+    def _read_rows(self, file_name):
+        note = self.connection.execute(
+            "SELECT doctor_id, patient_id, date, doctor_note, features, extra FROM notes WHERE file_name = ?", (file_name,)
+        ).fetchone()
+        if note is None:
+            raise FileNotFoundError(f"No such note: {file_name}")
+        doctor_id, patient_id, note_date, doctor_note, features, extra = note
+        diagnosis = self.connection.execute("SELECT document FROM diagnoses WHERE file_name = ?", (file_name,)).fetchone()
+        if features is None:
+            rows = self.connection.execute(
+                "SELECT name, document FROM symptoms WHERE file_name = ? ORDER BY position", (file_name,)
+            ).fetchall()
+            features = {"symptoms": {name: json.loads(document) for name, document in rows}}
+        else:
+            features = json.loads(features)
+
+        data = {
+            "doctor_id": doctor_id,
+            "patient_id": patient_id,
+            "date": note_date,
+            "doctor_note": doctor_note,
+            "diagnosis": json.loads(diagnosis[0]) if diagnosis else {},
+            "features": features,
+        }
+        if extra:
+            data.update(json.loads(extra))
+        return data
+
+    def read_note(self, note):
+        with self.lock:
+            return self._read_rows(note_file_name(note))
+
+    def exists(self, note):
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM notes WHERE file_name = ?", (note_file_name(note),)).fetchone() is not None
+
+    def write_note(self, file_name, data):
+        file_name = note_file_name(file_name)
+        with self.lock, self.connection:
+            self._write_rows(file_name, data, time.time())
+        return self.note_path(file_name)
+
+    def update_note(self, note, update):
+        file_name = note_file_name(note)
+        with self.lock, self.connection:
+            data = self._read_rows(file_name)
+            update(data)
+            created_at = self.connection.execute("SELECT created_at FROM notes WHERE file_name = ?", (file_name,)).fetchone()[0]
+            self._write_rows(file_name, data, created_at)
+        return data
+
+    def all_notes(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT file_name FROM notes ORDER BY created_at").fetchall()
+        return [self.note_path(row[0]) for row in rows]
+
+    def notes_of_patient(self, doctor_id, patient_id):
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT file_name FROM notes WHERE doctor_id = ? AND patient_id = ? ORDER BY created_at DESC",
+                (str(doctor_id), str(patient_id)),
+            ).fetchall()
+        return [self.note_path(row[0]) for row in rows]
+
+    def latest_note(self, doctor_id=None, patient_id=None):
+        query = "SELECT file_name FROM notes"
+        conditions, parameters = [], []
+        if doctor_id is not None:
+            conditions.append("doctor_id = ?")
+            parameters.append(str(doctor_id))
+        if patient_id is not None:
+            conditions.append("patient_id = ?")
+            parameters.append(str(patient_id))
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC LIMIT 1"
+        with self.lock:
+            row = self.connection.execute(query, parameters).fetchone()
+        return self.note_path(row[0]) if row else None
+
+    def notes_in_range(self, doctor_id, patient_id, start_date, end_date):
+        end_date = str(end_date)
+        if len(end_date) == 10:
+            end_date += "T23:59:59"
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT file_name FROM notes WHERE doctor_id = ? AND patient_id = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (str(doctor_id), str(patient_id), str(start_date), end_date),
+            ).fetchall()
+        return [self.note_path(row[0]) for row in rows]
+
+
+_save_lock = threading.Lock()
+
+
+def save_note(doctor_id, patient_id, selected_date, doctor_note, diagnosis, features, store=None, keep_time=False):
+    """Store a new note dated `selected_date` (datetime or ISO string); returns (path, document).
+
+    The note is timestamped with the current time of day unless `keep_time` keeps the time of
+    `selected_date` (bulk imports); a name that is already taken moves on to the next free second.
+    """
+    store = store or get_note_store()
+    if not isinstance(selected_date, datetime):
+        selected_date = datetime.fromisoformat(selected_date) if keep_time else datetime.fromisoformat(selected_date.split('T')[0])
+    if not keep_time:
+        selected_date = datetime.combine(selected_date.date(), datetime.now().time().replace(microsecond=0))
+
+    with _save_lock:
+        while True:
+            formatted_date = selected_date.strftime("%Y-%m-%d")
+            current_time = selected_date.strftime("%H:%M:%S")
+            filename = f"doctor_note_{formatted_date.replace('-', '')}_{current_time.replace(':', '')}_{doctor_id}_{patient_id}.json"
+            if not store.exists(filename):
+                break
+            selected_date += timedelta(seconds=1)
+        data = {
+            "doctor_id": doctor_id,
+            "patient_id": patient_id,
+            "date": f"{formatted_date}T{current_time}",
+            "doctor_note": doctor_note,
+            "diagnosis": diagnosis,
+            "features": features
+        }
+        file_path = store.write_note(filename, data)
+    append_to_symptom_table(file_path, data)
+    return file_path, data
+
+
+def edit_note(note, edits, store=None):
+    """Apply edit records to a stored note and return the updated document"""
+    data = (store or get_note_store()).apply_edits(note, edits)
+    append_to_symptom_table(note, data)
+    return data
+
+
+def migrate_directory(doctor_notes_dir=DOCTOR_NOTES_DIR, store=None):
+    """Copy every JSON note of a directory into a store (SQLite by default); returns the number migrated"""
+    store = store or SQLiteNoteStore()
+    source = FileSystemNoteStore(doctor_notes_dir)
+    migrated = 0
+    paths = []
+    for root, _, filenames in os.walk(doctor_notes_dir):
+        paths += [os.path.join(root, filename) for filename in filenames if parse_note_filename(filename)]
+    # Oldest first, so "most recent first" ordering is preserved in the target
+    for path in sorted(paths, key=os.path.getctime):
+        try:
+            data = source.read_note(path)
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        store.write_note(os.path.basename(path), data)
+        migrated += 1
+    return migrated
+
+
+_note_store = None
+_note_store_lock = threading.Lock()
+
+
+def get_note_store():
+    """The configured note store (NOTE_STORE=filesystem|sqlite)"""
+    global _note_store
+    if _note_store is None:
+        with _note_store_lock:
+            if _note_store is None:
+                _note_store = SQLiteNoteStore() if NOTE_STORE == "sqlite" else FileSystemNoteStore()
+    return _note_store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Note storage tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="copy JSON notes into the SQLite store")
+    migrate_parser.add_argument("--from-dir", default=DOCTOR_NOTES_DIR)
+    migrate_parser.add_argument("--db", default=NOTE_DB_PATH)
+    reshard_parser = subparsers.add_parser("reshard", help="move the JSON notes into another directory layout")
+    reshard_parser.add_argument("--layout", choices=["flat", "sharded"], default=NOTE_LAYOUT)
+    reshard_parser.add_argument("--dir", default=DOCTOR_NOTES_DIR)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        count = migrate_directory(args.from_dir, SQLiteNoteStore(args.db))
+        print(f"Migrated {count} notes into {args.db}")
+    elif args.command == "reshard":
+        count = FileSystemNoteStore(args.dir, layout=args.layout).reshard()
+        print(f"Moved {count} notes into the {args.layout} layout")
@@ -0,0 +1,78 @@
+import json
+
+
+def _scan(text):
+    """Return the closing suffix for `text` and the positions where it can be cut safely"""
+    stack = []
+    in_string = False
+    escaped = False
+    cut_points = []
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            cut_points.append(position + 1)
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            cut_points.append(position + 1)
+        elif char == ",":
+            cut_points.append(position)
+
+    closing = ""
+    if in_string:
+        # A dangling backslash would escape the closing quote
+        closing = '"' if not escaped else '\\"'
+    return closing + "".join(reversed(stack)), cut_points
+
+
+def parse_partial_json(text):
+    """Best-effort parse of a JSON document that is still being generated.
+
+    Open strings, objects and arrays are closed; when that alone does not yield valid JSON
+    (e.g. a key without its value yet) the text is cut back to the last complete member.
+    Returns None if nothing parseable has arrived yet.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    text = text[start:]
+
+    closing, cut_points = _scan(text)
+    candidates = [text + closing]
+    for position in reversed(cut_points[-8:]):
+        prefix = text[:position]
+        candidates.append(prefix + _scan(prefix)[0])
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+class IncrementalJSONParser:
+    """Accumulates streamed text and exposes the latest partial parse"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.value = None
+
+    def feed(self, chunk):
+        """Add a chunk; return the partial document if it changed, otherwise None"""
+        self.buffer += chunk
+        value = parse_partial_json(self.buffer)
+        if value is None or value == self.value:
+            return None
+        self.value = value
+        return value
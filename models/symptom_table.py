@@ -0,0 +1,218 @@
+"""Columnar (Parquet) table of symptom observations, partitioned by patient.
+
+Every note write appends that note's symptom rows; an edited note is appended again and the
+newest version of each note wins on read. A patient's partition is compacted into one file once
+it holds more than SYMPTOM_TABLE_COMPACT_AFTER files. Queries for one patient scan only that
+patient's directory; date filters prune row groups instead of parsing note JSON.
+
+    python -m models.symptom_table rebuild     # (re)build the table from the note store
+    python -m models.symptom_table compact     # merge each patient's appended files into one
+
+pyarrow is optional: without it the table is disabled and callers fall back to the notes.
+"""
+import os
+import sys
+import threading
+import uuid
+from datetime import datetime
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+SYMPTOM_TABLE_DIR = os.environ.get("SYMPTOM_TABLE_DIR", 'data/symptom_table/')
+SYMPTOM_TABLE_ENABLED = pa is not None and os.environ.get("SYMPTOM_TABLE", "true").lower() in ("1", "true", "yes")
+COMPACT_AFTER = int(os.environ.get("SYMPTOM_TABLE_COMPACT_AFTER", "8"))  # files per patient partition
+
+if pa is not None:
+    SYMPTOM_SCHEMA = pa.schema([
+        ("patient_id", pa.string()),
+        ("doctor_id", pa.string()),
+        ("note_file", pa.string()),
+        ("date", pa.timestamp("s")),
+        ("diagnosis", pa.string()),
+        ("symptom_name", pa.string()),  # null on the marker row of a note without symptoms
+        ("location", pa.string()),
+        ("intensity", pa.int16()),  # null if not mentioned (-1 in the note)
+        ("is_active", pa.bool_()),
+        ("raw_data", pa.string()),
+        ("written_at", pa.timestamp("us")),
+    ])
+    PARTITIONING = ds.partitioning(pa.schema([("patient_id", pa.string())]), flavor="hive")
+
+_write_lock = threading.Lock()
+
+
+def _intensity(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value == -1 else value
+
+
+def note_rows(note_file, data):
+    """The table rows of one note document"""
+    diagnosis = data.get("diagnosis", {})
+    features = data.get("features", {})
+    symptoms = features.get("symptoms") if isinstance(features, dict) else None
+    common = {
+        "doctor_id": str(data.get("doctor_id")),
+        "note_file": os.path.basename(note_file),
+        "date": datetime.fromisoformat(data["date"]),
+        "diagnosis": diagnosis.get("diagnosis") if isinstance(diagnosis, dict) else None,
+        "written_at": datetime.now(),
+    }
+    rows = []
+    for name, symptom in (symptoms or {}).items():
+        rows.append(dict(
+            common,
+            symptom_name=name,
+            location=symptom.get("location"),
+            intensity=_intensity(symptom.get("intensity")),
+            is_active=str(symptom.get("is_active", "True")).lower() == "true",
+            raw_data=symptom.get("raw_data"),
+        ))
+    if not rows:
+        # Marks the note as present in the table
+        rows.append(dict(common, symptom_name=None, location=None, intensity=None, is_active=None, raw_data=None))
+    return rows
+
+
+def _partition_dir(table_dir, patient_id):
+    return os.path.join(table_dir, f"patient_id={patient_id}")
+
+
+def _part_files(partition_dir):
+    return [os.path.join(partition_dir, name) for name in os.listdir(partition_dir) if name.endswith(".parquet")]
+
+
+def _write_part(partition_dir, table):
+    # Written aside and renamed, so readers never see a partial file
+    path = os.path.join(partition_dir, f"part-{uuid.uuid4().hex}.parquet")
+    pq.write_table(table, f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+
+def append_notes(notes, table_dir=SYMPTOM_TABLE_DIR):
+    """Append {note_file: document} to the table, one file per patient partition"""
+    if not SYMPTOM_TABLE_ENABLED or not notes:
+        return
+    by_patient = {}
+    for note_file, data in notes.items():
+        by_patient.setdefault(str(data.get("patient_id")), []).extend(note_rows(note_file, data))
+    with _write_lock:
+        for patient_id, rows in by_patient.items():
+            partition_dir = _partition_dir(table_dir, patient_id)
+            os.makedirs(partition_dir, exist_ok=True)
+            _write_part(partition_dir, pa.Table.from_pylist(rows, schema=SYMPTOM_SCHEMA.remove(0)))
+            # Every save and edit adds a file; keep each scan down to a handful of files
+            if len(_part_files(partition_dir)) > COMPACT_AFTER:
+                _compact_partition(partition_dir, patient_id)
+
+
+def append_note(note_file, data, table_dir=SYMPTOM_TABLE_DIR):
+    append_notes({note_file: data}, table_dir)
+
+
+def _dataset(table_dir, patient_id=None):
+    if patient_id is None:
+        return ds.dataset(table_dir, format="parquet", partitioning=PARTITIONING, exclude_invalid_files=True)
+    # Only this patient's directory is listed and opened; its files carry no patient_id column
+    return ds.dataset(_part_files(_partition_dir(table_dir, patient_id)), format="parquet", schema=SYMPTOM_SCHEMA.remove(0))
+
+
+def read_symptom_table(patient_id=None, doctor_id=None, since=None, until=None, note_files=None, columns=None, table_dir=SYMPTOM_TABLE_DIR):
+    """Latest symptom rows matching the filters as a DataFrame (None if the table is unavailable).
+
+    Filters are pushed down to the Parquet scan; `since`/`until` are dates or ISO strings.
+    Marker rows of notes without symptoms are kept (symptom_name is null).
+    """
+    if not SYMPTOM_TABLE_ENABLED or not os.path.isdir(table_dir):
+        return None
+    if patient_id is not None and not os.path.isdir(_partition_dir(table_dir, patient_id)):
+        return pd.DataFrame(columns=columns if columns is not None else SYMPTOM_SCHEMA.names)
+    conditions = []
+    if doctor_id is not None:
+        conditions.append(ds.field("doctor_id") == str(doctor_id))
+    if since is not None:
+        conditions.append(ds.field("date") >= pa.scalar(pd.Timestamp(since).to_pydatetime(), pa.timestamp("s")))
+    if until is not None:
+        conditions.append(ds.field("date") <= pa.scalar(pd.Timestamp(until).to_pydatetime(), pa.timestamp("s")))
+    if note_files is not None:
+        conditions.append(ds.field("note_file").isin([os.path.basename(note_file) for note_file in note_files]))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    if columns is not None:
+        columns = list(dict.fromkeys(list(columns) + ["note_file", "written_at"]))
+    if patient_id is None:
+        df = _dataset(table_dir).to_table(columns=columns, filter=expression).to_pandas()
+    else:
+        scan_columns = None if columns is None else [column for column in columns if column != "patient_id"]
+        df = _dataset(table_dir, patient_id).to_table(columns=scan_columns, filter=expression).to_pandas()
+        if columns is None or "patient_id" in columns:
+            df.insert(0, "patient_id", str(patient_id))
+    if df.empty:
+        return df
+    # An edited note was appended again: keep only its newest version
+    latest = df.groupby("note_file")["written_at"].transform("max")
+    return df[df["written_at"] == latest].reset_index(drop=True)
+
+
+def _compact_partition(partition_dir, patient_id):
+    # Caller holds _write_lock
+    old_files = _part_files(partition_dir)
+    if len(old_files) <= 1:
+        return False
+    df = read_symptom_table(patient_id=patient_id, table_dir=os.path.dirname(partition_dir)).drop(columns=["patient_id"])
+    _write_part(partition_dir, pa.Table.from_pandas(df, schema=SYMPTOM_SCHEMA.remove(0), preserve_index=False))
+    for old_file in old_files:
+        os.remove(old_file)
+    return True
+
+
+def compact(table_dir=SYMPTOM_TABLE_DIR):
+    """Rewrite each patient partition as a single file holding only the latest note versions"""
+    if not SYMPTOM_TABLE_ENABLED or not os.path.isdir(table_dir):
+        return 0
+    compacted = 0
+    with _write_lock:
+        for entry in os.scandir(table_dir):
+            if entry.is_dir() and entry.name.startswith("patient_id="):
+                compacted += _compact_partition(entry.path, entry.name.split("=", 1)[1])
+    return compacted
+
+
+def rebuild(table_dir=SYMPTOM_TABLE_DIR):
+    """Re-create the table from every note in the note store"""
+    from models.storage import get_note_store
+    import shutil
+
+    shutil.rmtree(table_dir, ignore_errors=True)
+    store = get_note_store()
+    notes = {}
+    for path in store.all_notes():
+        try:
+            notes[os.path.basename(path)] = store.read_note(path)
+        except (IOError, ValueError) as e:
+            print(f"Skipping {path}: {e}")
+    append_notes(notes, table_dir)
+    return len(notes)
+
+
+if __name__ == "__main__":
+    if pa is None:
+        print("pyarrow is not installed")
+    elif sys.argv[1:] == ["rebuild"]:
+        print(f"Added {rebuild()} notes to {SYMPTOM_TABLE_DIR}")
+    elif sys.argv[1:] == ["compact"]:
+        print(f"Compacted {compact()} patient partitions")
+    else:
+        print(__doc__)
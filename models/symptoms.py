@@ -1,88 +1,111 @@
-from groq import Groq
 import json
 import os
 import pandas as pd
 import plotly.graph_objects as go
 import re
+from models.catalog import parse_note_filename
+from models.llm import chat_completion
+from models.matching import match_symptoms_locally
+from models.storage import get_note_store
+from models.symptom_table import read_symptom_table
+
+
+SYMPTOM_REGISTRY_DIR = 'data/symptom_registry/'
+SYMPTOM_COLUMNS = ["symptom", "symptom_name", "doctor_note_file", "diagnosis", "date", "location", "intensity", "is_active", "raw_data"]
 
 
 def clean_filename(filename):
     # Use regex to match the expected format: 'doctor_note_yyyymmdd_hhmmss_doctorid_patientid.json' and return the matched string
+    # (works for bare names as well as flat or sharded paths)
     match = re.search(r'doctor_note_\d{8}_\d{6}_\d+_\d+\.json', filename)
     return match.group(0) if match else None
 
 
-def map_symptom_names(doctor_note_files):
-    all_symptoms = {}
-    for doctor_note_file_path in doctor_note_files:
-        # Read the JSON file instead of parsing the file path
-        with open(doctor_note_file_path, 'r') as file:
-            doctor_note = json.load(file)
-        features = doctor_note["features"]
-        for symptom in features["symptoms"].items():
-            key = os.path.basename(doctor_note_file_path)
-            if key not in all_symptoms:
-                all_symptoms[key] = []
-            all_symptoms[key]+= [symptom]
-    
-    input_json_string = json.dumps(all_symptoms, indent=2)
-    
-    client = Groq(api_key="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")
+def load_doctor_notes(doctor_note_files):
+    return get_note_store().read_notes(doctor_note_files)
+
+
+def registry_path(patient_id):
+    return os.path.join(SYMPTOM_REGISTRY_DIR, f"patient_{patient_id}.json")
+
+
+def load_symptom_registry(patient_id):
+    # The registry holds the canonical symptom names of a patient and, per processed note,
+    # the symptom names that were mapped (so edited notes can be detected and re-mapped)
+    path = registry_path(patient_id)
+    if os.path.exists(path):
+        with open(path, 'r') as file:
+            return json.load(file)
+    return {"patient_id": patient_id, "symptoms": {}, "notes": {}}
+
+
+def save_symptom_registry(registry):
+    os.makedirs(SYMPTOM_REGISTRY_DIR, exist_ok=True)
+    path = registry_path(registry["patient_id"])
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as file:
+        json.dump(registry, file, indent=2)
+    os.replace(temp_path, path)
+
+
+def remove_notes_from_registry(registry, note_files):
+    for canonical in list(registry["symptoms"]):
+        for note_file in note_files:
+            registry["symptoms"][canonical].pop(note_file, None)
+        if not registry["symptoms"][canonical]:
+            del registry["symptoms"][canonical]
+    for note_file in note_files:
+        registry["notes"].pop(note_file, None)
+
+
+def map_new_symptoms(canonical_symptoms, new_symptoms, use_cache=True):
+    # Map the symptoms of new notes onto the patient's existing canonical symptom names
+    if not canonical_symptoms and len(new_symptoms) == 1:
+        # Nothing to match against: every symptom of a single note is its own canonical symptom
+        (note_file, symptom_names), = new_symptoms.items()
+        return {"symptoms": {name: {note_file: name} for name in symptom_names}}
+
+    input_json_string = json.dumps({"canonical_symptoms": canonical_symptoms, "new_notes": new_symptoms}, indent=2)
 
-    prompt = """You are an assistant that ONLY TALKS JSON. You are tasked with matching symptoms from multiple doctor notes into structured JSON format that maps symptoms to similar symptoms across multiple doctor notes.
+    prompt = """You are an assistant that ONLY TALKS JSON. You are tasked with matching the symptoms of new doctor notes to the canonical symptom names already known for a patient.
+    Reuse a canonical symptom name whenever a new symptom refers to the same symptom. Only introduce a new canonical name for symptoms that match none of them. Symptoms from different new notes that refer to the same symptom share one canonical name.
     The JSON output should follow the following structure:
     {
         "symptoms":{
-            "symptom":{
+            "canonical_symptom":{
                 "doctor_note_file_1":"symptom_name_as_in_doctor_note_1",
                 "doctor_note_file_2":"symptom_name_as_in_doctor_note_2",
                 ...
             }
         }
     }
-    DON'T RETURN ANYTHING ELSE BUT THE MAPPING OF SYMPTOMS IN VALID JSON FORMAT.
- 
+    DON'T RETURN ANYTHING ELSE BUT THE MAPPING OF THE NEW SYMPTOMS IN VALID JSON FORMAT.
+
     EXAMPLE INPUT:
     {
-        "doctor_note_file_1":[
-            "symptom_1_as_in_doctor_note_1",
-            "symptom_2_as_in_doctor_note_1",
-            "symptom_3_as_in_doctor_note_1",
-            ...
-        ],
-        "doctor_note_file_2":[
-            "symptom_1_as_in_doctor_note_2",
-            "symptom_2_as_in_doctor_note_2",
-            "symptom_4_as_in_doctor_note_2",
-            ...
+        "canonical_symptoms":[
+            "lumbar pain",
+            "headache"
         ],
-        ...
+        "new_notes":{
+            "doctor_note_file_3":[
+                "lower back pain",
+                "nausea"
+            ]
+        }
     }
     EXAMPLE OUTPUT:
     {
         "symptoms":{
-            "symptom_1":{
-                "doctor_note_file_1":"symptom_1_as_in_doctor_note_1",
-                "doctor_note_file_2":"symptom_1_as_in_doctor_note_2",
-                ...
-            },
-            "symptom_2":{
-                "doctor_note_file_1":"symptom_2_as_in_doctor_note_1",
-                "doctor_note_file_2":"symptom_2_as_in_doctor_note_2",
-                ...
-            },
-            "symptom_3":{
-                "doctor_note_file_1":"symptom_3_as_in_doctor_note_1",
-                ...
-            },
-            "symptom_4":{
-                "doctor_note_file_1":"symptom_4_as_in_doctor_note_1",
-                ...
+            "lumbar pain":{
+                "doctor_note_file_3":"lower back pain"
             },
-            ...
+            "nausea":{
+                "doctor_note_file_3":"nausea"
+            }
         }
     }
-    
+
     INPUT:
     """
 
@@ -91,14 +114,13 @@ def map_symptom_names(doctor_note_files):
     
                 OUTPUT:
                 """
-    response = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="llama-3.1-70b-versatile",
-    )
-
-    result = response.choices[0].message.content.strip()
+    # Only a mapping that parses and has symptoms is cached, so a truncated answer is not replayed
+    result = chat_completion(
+        prompt, use_cache=use_cache, call_site="symptom_mapping", validate=lambda content: json.loads(content.strip())["symptoms"]
+    ).strip()
     try:
         res = json.loads(result)
+        res["symptoms"]
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON: {e}")
         print(f"Raw result: {result}")
@@ -114,13 +136,149 @@ def map_symptom_names(doctor_note_files):
     return res
 
 
+def merge_into_registry(registry, new_symptoms, mapping):
+    # Only accept names that really occur in the new notes, each mapped once
+    unmapped = {note_file: set(names) for note_file, names in new_symptoms.items()}
+    for canonical, note_mapping in mapping["symptoms"].items():
+        for note_file, symptom_name in note_mapping.items():
+            if symptom_name in unmapped.get(note_file, ()) and note_file not in registry["symptoms"].get(canonical, {}):
+                registry["symptoms"].setdefault(canonical, {})[note_file] = symptom_name
+                unmapped[note_file].discard(symptom_name)
+
+    # Symptoms the model left out become their own canonical symptom
+    for note_file, names in unmapped.items():
+        for symptom_name in names:
+            canonical = symptom_name
+            while note_file in registry["symptoms"].get(canonical, {}):
+                canonical += " (2)"
+            registry["symptoms"].setdefault(canonical, {})[note_file] = symptom_name
+
+    for note_file, names in new_symptoms.items():
+        registry["notes"][note_file] = sorted(names)
+
+
+def mapping_for_notes(registry, note_files):
+    note_files = set(note_files)
+    symptoms = {}
+    for canonical, note_mapping in registry["symptoms"].items():
+        selected = {note_file: name for note_file, name in note_mapping.items() if note_file in note_files}
+        if selected:
+            symptoms[canonical] = selected
+    return {"symptoms": symptoms}
+
+
+def symptom_locations(doctor_note):
+    return {name: data.get("location", "") for name, data in doctor_note["features"]["symptoms"].items()}
+
+
+def canonical_symptom_locations(registry, doctor_notes):
+    # Canonical symptom -> {note_file: (name, location)}; location is only known for loaded notes
+    canonical_symptoms = {}
+    for canonical, note_mapping in registry["symptoms"].items():
+        canonical_symptoms[canonical] = {}
+        for note_file, symptom_name in note_mapping.items():
+            location = ""
+            if note_file in doctor_notes:
+                location = doctor_notes[note_file]["features"]["symptoms"].get(symptom_name, {}).get("location", "")
+            canonical_symptoms[canonical][note_file] = (symptom_name, location)
+    return canonical_symptoms
+
+
+def map_symptom_names(doctor_note_files, use_cache=True):
+    doctor_notes = load_doctor_notes(doctor_note_files)
+    if not doctor_notes:
+        return {"symptoms": {}}
+
+    patient_id = next(iter(doctor_notes.values()))["patient_id"]
+    registry = load_symptom_registry(patient_id)
+
+    # Notes that were never mapped, or whose symptoms were edited since they were mapped
+    new_symptoms = {}
+    for note_file, doctor_note in doctor_notes.items():
+        symptom_names = sorted(doctor_note["features"]["symptoms"])
+        if registry["notes"].get(note_file) != symptom_names:
+            new_symptoms[note_file] = symptom_names
+
+    if new_symptoms:
+        remove_notes_from_registry(registry, new_symptoms)
+
+        # Fast path: settle lexically obvious matches locally, only the rest goes to the LLM
+        mapping, ambiguous = match_symptoms_locally(
+            canonical_symptom_locations(registry, doctor_notes),
+            {note_file: symptom_locations(doctor_notes[note_file]) for note_file in new_symptoms},
+        )
+        if ambiguous:
+            canonical_symptoms = sorted(set(registry["symptoms"]) | set(mapping["symptoms"]))
+            llm_mapping = map_new_symptoms(canonical_symptoms, ambiguous, use_cache=use_cache)
+            if "symptoms" not in llm_mapping:
+                return llm_mapping
+            for canonical, note_mapping in llm_mapping["symptoms"].items():
+                for note_file, symptom_name in note_mapping.items():
+                    mapping["symptoms"].setdefault(canonical, {}).setdefault(note_file, symptom_name)
+
+        merge_into_registry(registry, new_symptoms, mapping)
+        save_symptom_registry(registry)
+
+    return mapping_for_notes(registry, doctor_notes)
+
+
+def notes_patient_id(doctor_note_files):
+    """The patient all of the notes belong to, from their file names (None if mixed or unknown)"""
+    parsed = [parse_note_filename(note_file) for note_file in doctor_note_files]
+    patient_ids = {entry[1] if entry else None for entry in parsed}
+    return patient_ids.pop() if len(patient_ids) == 1 else None
+
+
+def symptom_dataframe_from_table(symptom_mapping, doctor_note_files, patient_id=None):
+    # Same frame as create_symptom_dataframe, read from the columnar symptom table;
+    # None if the table is unavailable or does not hold all of the notes yet.
+    # With `patient_id` only that patient's partition is scanned.
+    note_files = {os.path.basename(note_file) for note_file in doctor_note_files}
+    table = read_symptom_table(patient_id=patient_id, note_files=note_files)
+    if table is None or set(table["note_file"]) != note_files:
+        return None
+    if symptom_mapping is None:
+        patient_id = table["patient_id"].iloc[0]
+        symptom_mapping = mapping_for_notes(load_symptom_registry(patient_id), note_files)
+
+    pairs = pd.DataFrame(
+        [
+            (symptom, clean_filename(note_file), symptom_name)
+            for symptom, note_mapping in symptom_mapping["symptoms"].items()
+            for note_file, symptom_name in note_mapping.items()
+        ],
+        columns=["symptom", "doctor_note_file", "symptom_name"],
+    )
+    if pairs.empty:
+        return pd.DataFrame()
+    df = pairs.merge(
+        table.rename(columns={"note_file": "doctor_note_file"}), on=["doctor_note_file", "symptom_name"], how="left"
+    )
+    return pd.DataFrame({
+        "symptom": df["symptom"],
+        "symptom_name": df["symptom_name"],
+        "doctor_note_file": df["doctor_note_file"],
+        "diagnosis": df["diagnosis"],
+        "date": pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%dT%H:%M:%S"),
+        "location": df["location"].where(df["location"] != "-1", None),
+        "intensity": df["intensity"].astype(float),
+        "is_active": df["is_active"].astype(bool),
+        "raw_data": df["raw_data"].where(df["raw_data"] != "-1", None),
+    })
+
+
 def create_symptom_dataframe(symptom_mapping, doctor_note_files):
-    doctor_note_files_dict = {}
-    for doctor_note_file_path in doctor_note_files:
-        # Read the JSON file instead of parsing the file path
-        with open(doctor_note_file_path, 'r') as file:
-            doctor_note = json.load(file)
-        doctor_note_files_dict[os.path.basename(doctor_note_file_path)] = doctor_note
+    from_table = symptom_dataframe_from_table(symptom_mapping, doctor_note_files, patient_id=notes_patient_id(doctor_note_files))
+    if from_table is not None:
+        return from_table
+
+    records = get_note_store().read_records(doctor_note_files)
+    if symptom_mapping is None:
+        # Read the canonical mapping straight from the patient's symptom registry
+        if not records:
+            return pd.DataFrame()
+        patient_id = next(iter(records.values())).patient_id
+        symptom_mapping = mapping_for_notes(load_symptom_registry(patient_id), records)
     
     rows = []
     # Loop through each symptom in the symptom_mapping
@@ -129,25 +287,24 @@ def create_symptom_dataframe(symptom_mapping, doctor_note_files):
         for doctor_note_file_name in symptom_mapping["symptoms"][symptom]:
             symptom_name = symptom_mapping["symptoms"][symptom][doctor_note_file_name]
             doctor_note_file_name = clean_filename(doctor_note_file_name)
-            doctor_note = doctor_note_files_dict[doctor_note_file_name]
-            # Update this line to correctly access the diagnosis
-            diagnosis = doctor_note["diagnosis"]["diagnosis"]
-            symptom_data = doctor_note["features"]["symptoms"][symptom_name]
-            row = {
-                "symptom": symptom,
-                "symptom_name": symptom_name,
-                "doctor_note_file": doctor_note_file_name,
-                "diagnosis": diagnosis,
-                "date": doctor_note["date"],
-                "location": symptom_data["location"],
-                "intensity": symptom_data["intensity"],
-                "is_active": symptom_data["is_active"],
-                "raw_data": symptom_data["raw_data"]
-            }
-            # Replace -1 values with None
-            row = {k: None if (v == -1 or v == "-1") else v for k, v in row.items()}
-            rows.append(row)
-    return pd.DataFrame(rows)
+            note = records[doctor_note_file_name]
+            symptom_data = note.symptoms[symptom_name]
+            rows.append((
+                symptom,
+                symptom_name,
+                doctor_note_file_name,
+                note.diagnosis.diagnosis,
+                note.date,
+                None if symptom_data.location == "-1" else symptom_data.location,
+                symptom_data.intensity,  # None if not mentioned
+                symptom_data.is_active,
+                None if symptom_data.raw_data == "-1" else symptom_data.raw_data,
+            ))
+    df = pd.DataFrame(rows, columns=SYMPTOM_COLUMNS)
+    # Typed columns: intensity float (NaN if not mentioned), is_active bool
+    df["intensity"] = df["intensity"].astype(float)
+    df["is_active"] = df["is_active"].astype(bool)
+    return df
 
 
 def create_symptom_list(symptom_dataframe):
@@ -0,0 +1,146 @@
+"""User directory: users.json loaded once into username/role indexes, reloaded when the file changes.
+
+Stored passwords may be PBKDF2 hashes ('pbkdf2_sha256$<iterations>$<salt>$<hash>'), legacy
+SHA-256 hex digests or plaintext; every form is checked in constant time. Logging in never
+rewrites users.json; legacy entries are only upgraded by the explicit command:
+
+    python -m models.users upgrade-hashes     # rewrite plaintext and SHA-256 passwords as PBKDF2 hashes
+"""
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+
+
+USERS_PATH = os.environ.get("USERS_PATH", 'data/users/users.json')
+PBKDF2_ITERATIONS = int(os.environ.get("USER_PBKDF2_ITERATIONS", "600000"))
+SHA256_HEX_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+def hash_password(password, iterations=PBKDF2_ITERATIONS, prehashed=False):
+    """PBKDF2 hash of a password; `prehashed` hashes a legacy SHA-256 hex digest instead of the password"""
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("utf-8"), iterations).hex()
+    scheme = "pbkdf2_sha256_prehashed" if prehashed else "pbkdf2_sha256"
+    return f"{scheme}${iterations}${salt}${digest}"
+
+
+def is_legacy_hash(stored):
+    return not stored.startswith("pbkdf2_sha256")
+
+
+def verify_password(password, stored):
+    """Check a password against any supported stored form, in constant time.
+
+    Legacy forms run a PBKDF2 of the same cost as well, so a login takes as long whether the
+    user exists or not and whatever form their password is stored in.
+    """
+    password = password or ""
+    if stored.startswith("pbkdf2_sha256"):
+        scheme, iterations, salt, digest = stored.split("$")
+        if scheme == "pbkdf2_sha256_prehashed":
+            # Upgraded legacy entry: PBKDF2 over the SHA-256 hex digest of the password
+            password = hashlib.sha256(password.encode("utf-8")).hexdigest()
+        candidate = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("utf-8"), int(iterations)).hex()
+        return hmac.compare_digest(candidate, digest)
+    hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), b"legacy", PBKDF2_ITERATIONS)
+    if SHA256_HEX_PATTERN.fullmatch(stored):
+        return hmac.compare_digest(hashlib.sha256(password.encode("utf-8")).hexdigest(), stored)
+    return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+
+
+class UserDirectory:
+    def __init__(self, path=USERS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self._signature = None
+        self.users = {}
+        self.by_username = {}
+        self.by_role = {}
+        self.patient_names = {}
+        # Checked for unknown usernames, so they take as long as a wrong password
+        self._dummy_hash = hash_password(secrets.token_hex(8))
+
+    def _refresh(self):
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+        with self.lock:
+            if signature == self._signature:
+                return
+            with open(self.path, 'r') as file:
+                users = json.load(file)
+            by_role = {}
+            for user_id, info in users.items():
+                by_role.setdefault(info['role'], {})[user_id] = info
+            self.users = users
+            self.by_username = {info['username']: (user_id, info) for user_id, info in users.items()}
+            self.by_role = by_role
+            self.patient_names = {f"{info['first_name']} {info['last_name']}": user_id for user_id, info in by_role.get('patient', {}).items()}
+            self._signature = signature
+
+    def authenticate(self, username, password):
+        """Return (user_id, user_info) for valid credentials, else None"""
+        self._refresh()
+        user = self.by_username.get(username)
+        if user is None:
+            verify_password(password, self._dummy_hash)
+            return None
+        if not verify_password(password, user[1]['password']):
+            return None
+        return user
+
+    def users_with_role(self, role):
+        self._refresh()
+        return dict(self.by_role.get(role, {}))
+
+    def patients(self):
+        """Patient display name -> user id"""
+        self._refresh()
+        return dict(self.patient_names)
+
+    def _write(self, users):
+        temp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(users, file, indent=4)
+        os.replace(temp_path, self.path)
+
+    def upgrade_hashes(self):
+        """Rewrite plaintext and legacy SHA-256 passwords as PBKDF2 hashes; returns the number upgraded"""
+        with self.lock:
+            with open(self.path, 'r') as file:
+                users = json.load(file)
+            upgraded = 0
+            for info in users.values():
+                stored = info['password']
+                if not is_legacy_hash(stored):
+                    continue
+                info['password'] = hash_password(stored, prehashed=bool(SHA256_HEX_PATTERN.fullmatch(stored)))
+                upgraded += 1
+            self._write(users)
+        return upgraded
+
+
+_user_directory = None
+_user_directory_lock = threading.Lock()
+
+
+def get_user_directory():
+    global _user_directory
+    if _user_directory is None:
+        with _user_directory_lock:
+            if _user_directory is None:
+                _user_directory = UserDirectory()
+    return _user_directory
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["upgrade-hashes"]:
+        print(f"Upgraded {get_user_directory().upgrade_hashes()} password hashes")
+    else:
+        print(__doc__)
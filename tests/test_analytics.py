@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from models.analytics import segment_table
+
+
+def reference_drawable(df):
+    # The original per-segment loop: no inactive observation strictly between two consecutive active points
+    drawable = []
+    active = df[df['is_active']]
+    for symptom in active['symptom'].unique():
+        dates = active[active['symptom'] == symptom].sort_values('date', kind='stable')['date'].tolist()
+        for start, end in zip(dates, dates[1:]):
+            between = df[(df['symptom'] == symptom) & (df['date'] > start) & (df['date'] < end) & (~df['is_active'])]
+            drawable.append(len(between) == 0)
+    return drawable
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=['symptom', 'date', 'intensity', 'is_active'])
+
+
+def test_inactive_point_on_a_repeated_date_is_not_between():
+    df = frame([
+        ('headache', '2024-01-01', 3, True),
+        ('headache', '2024-01-01', 5, True),
+        ('headache', '2024-01-01', -1, False),
+        ('headache', '2024-01-02', 4, True),
+    ])
+    assert segment_table(df)['drawable'].tolist() == [True, True]
+
+
+def test_drawable_matches_the_original_loop_with_duplicate_timestamps():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        size = int(rng.integers(2, 40))
+        df = pd.DataFrame({
+            'symptom': rng.choice(['headache', 'nausea', 'fatigue'], size),
+            'date': rng.choice(pd.date_range('2024-01-01', periods=6).strftime('%Y-%m-%d'), size),
+            'intensity': rng.integers(0, 10, size),
+            'is_active': rng.random(size) < 0.7,
+        })
+        assert segment_table(df)['drawable'].tolist() == reference_drawable(df)